@@ -0,0 +1,12 @@
+import os
+
+
+def app_data_path(filename):
+    """Path for a per-user data file under %LOCALAPPDATA%/ScreenRecorder (home directory elsewhere)"""
+    base = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, "ScreenRecorder", filename)
+
+
+def recordings_dir():
+    """Folder the recorder saves into: Desktop/Screen Recordings"""
+    return os.path.join(os.path.expanduser("~"), "Desktop", "Screen Recordings")
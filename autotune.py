@@ -0,0 +1,190 @@
+"""Calibrates the recorder's worker counts, chunk sizes and buffer depth for this machine.
+
+Measures capture latency, per-frame resize/quantize/encode cost and how
+processing throughput scales with threads, using synthetic frames at the
+screen's size, and derives a profile that ScreenRecorder.apply_performance_profile
+understands. The app runs it on first start (and when the core count
+changes); it can also be run by hand:
+
+    python autotune.py            # calibrate and store the profile in settings.json
+    python autotune.py --dry-run  # only print it
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Bump when the profile's meaning changes, so stored profiles get recalibrated
+PROFILE_VERSION = 1
+# Work per thread pool task; long enough to amortize task overhead, short
+# enough that a chunk spreads evenly over the workers
+TARGET_TASK_MS = 25
+# Wall time per encode chunk, which is also the progress/cancel granularity
+TARGET_ENCODE_CHUNK_MS = 500
+CAPTURE_FPS = 30
+
+
+def _median_ms(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure_capture(repeats=10):
+    """(median grab latency in ms, (width, height)) of the primary screen, or (None, None) headless"""
+    import mss
+    from frame_sources import MSSFrameSource
+    try:
+        with mss.mss() as sct:
+            monitor = sct.monitors[1]
+            region = {key: monitor[key] for key in ("left", "top", "width", "height")}
+            source = MSSFrameSource(sct)
+            source.grab(region)
+            latency = _median_ms(lambda: source.grab(region), repeats)
+        return latency, (region["width"], region["height"])
+    except Exception:
+        return None, None
+
+
+def measure_thread_scaling(frame, quality, cores, frames_per_worker=10):
+    """Frames/sec of process_frame for thread counts up to twice the cores"""
+    from frame_processing import process_frame
+    results = {}
+    workers = 1
+    while workers <= max(2, cores * 2):
+        count = frames_per_worker * workers
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(process_frame, [frame] * workers, [quality] * workers))  # warm up
+            started = time.perf_counter()
+            list(pool.map(process_frame, [frame] * count, [quality] * count))
+            results[workers] = count / (time.perf_counter() - started)
+        workers *= 2
+    return results
+
+
+def measure(width=1920, height=1080):
+    """Raw measurements for this machine"""
+    # Imported here so the app can check needs_calibration without loading OpenCV
+    import cv2
+    from frame_sources import SyntheticFrameSource
+    from frame_processing import process_frame, convert_gif_frame, GIF_COLORS
+    from gif_palette import build_palette
+
+    cores = os.cpu_count() or 1
+    capture_ms, screen_size = measure_capture()
+    if screen_size:
+        width, height = screen_size
+    source = SyntheticFrameSource(width, height)
+    region = source.default_region()
+    frames = [cv2.cvtColor(source.grab(region), cv2.COLOR_BGRA2BGR) for _ in range(4)]
+    frame = frames[-1]
+
+    process_ms = {quality: _median_ms(lambda: process_frame(frame, quality), 5)
+                  for quality in ("high", "medium", "low")}
+    processed = process_frame(frame, "medium")
+    palette = build_palette([process_frame(f, "medium") for f in frames], GIF_COLORS["medium"] - 1)
+    quantize_ms = _median_ms(lambda: convert_gif_frame(processed, "medium", palette), 5)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        writer = cv2.VideoWriter(os.path.join(scratch, "calibrate.mp4"), cv2.VideoWriter_fourcc(*"mp4v"),
+                                 CAPTURE_FPS, (width, height))
+        try:
+            video_write_ms = _median_ms(lambda: writer.write(frame), 10)
+        finally:
+            writer.release()
+
+    return {
+        "cpu_count": cores,
+        "width": width,
+        "height": height,
+        "capture_ms": round(capture_ms, 2) if capture_ms is not None else None,
+        "process_ms": {quality: round(ms, 2) for quality, ms in process_ms.items()},
+        "quantize_ms": round(quantize_ms, 2),
+        "video_write_ms": round(video_write_ms, 2),
+        "thread_fps": {str(workers): round(fps, 1)
+                       for workers, fps in measure_thread_scaling(frame, "medium", cores).items()},
+    }
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def derive_profile(measured):
+    """Turn measurements into recorder settings"""
+    thread_fps = {int(workers): fps for workers, fps in measured["thread_fps"].items()}
+    best = max(thread_fps.values())
+    # Fewest threads within 10% of the best throughput; more only add contention
+    thread_workers = min(workers for workers, fps in thread_fps.items() if fps >= best * 0.9)
+
+    # Frames a second capture can actually deliver; slow grabs mean fewer frames to buffer
+    capture_fps = CAPTURE_FPS
+    if measured.get("capture_ms"):
+        capture_fps = min(CAPTURE_FPS, 1000.0 / measured["capture_ms"])
+
+    process_ms = max(measured["process_ms"]["medium"], 0.01)
+    sub_chunk_size = _clamp(math.ceil(TARGET_TASK_MS / process_ms), 5, 50)
+    # One round of tasks per chunk, but never more than ~4 s of capture held back
+    chunk_size = _clamp(thread_workers * sub_chunk_size, 10, 4 * capture_fps)
+    gif_chunk_size = _clamp(TARGET_ENCODE_CHUNK_MS / max(measured["quantize_ms"], 0.01) * thread_workers, 20, 400)
+    video_chunk_size = _clamp(TARGET_ENCODE_CHUNK_MS / max(measured["video_write_ms"], 0.01), 50, 1000)
+
+    # Buffer depth: two chunks plus a couple of seconds of capture, more when
+    # processing can't comfortably keep up and bursts have to be absorbed
+    buffer_seconds = 2 if best >= 2 * capture_fps else 6
+    buffer_frames = 2 * chunk_size + buffer_seconds * capture_fps
+    frame_mb = measured["width"] * measured["height"] * 3 / (1024 * 1024)
+    buffer_memory_mb = _clamp(buffer_frames * frame_mb, 128, 1024)
+
+    return {
+        "version": PROFILE_VERSION,
+        "calibrated": time.time(),
+        "cpu_count": measured["cpu_count"],
+        "thread_workers": thread_workers,
+        "process_workers": max(1, measured["cpu_count"] - 1),
+        "chunk_size": chunk_size,
+        "sub_chunk_size": sub_chunk_size,
+        "gif_chunk_size": gif_chunk_size,
+        "video_chunk_size": video_chunk_size,
+        "buffer_memory_mb": buffer_memory_mb,
+        "measured": measured,
+    }
+
+
+def calibrate():
+    """Measure this machine and return a performance profile (takes a few seconds)"""
+    return derive_profile(measure())
+
+
+def needs_calibration(profile):
+    """True when there is no stored profile or it was made for other hardware or an older format"""
+    return (not profile or profile.get("version") != PROFILE_VERSION
+            or profile.get("cpu_count") != os.cpu_count())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate recorder performance settings for this machine")
+    parser.add_argument("--dry-run", action="store_true", help="print the profile without saving it")
+    args = parser.parse_args(argv)
+
+    profile = calibrate()
+    print(json.dumps(profile, indent=2))
+    if not args.dry_run:
+        from settings import Settings
+        settings = Settings()
+        settings.update_performance_profile(profile)
+        settings.save_settings()
+        print(f"Profile saved to {settings.settings_file}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
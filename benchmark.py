@@ -0,0 +1,184 @@
+"""Benchmarks for the recorder's processing and encoding stages.
+
+Runs ScreenRecorder's frame processing (process_frame_chunk), GIF export
+and MP4 export on deterministic synthetic frames for a grid of
+resolutions, qualities and frame rates, and writes the results as JSON so
+runs from different commits can be compared. Headless; Linux and macOS.
+
+    python benchmark.py                      # full grid
+    python benchmark.py --quick              # 640x360 only
+    python benchmark.py --compare benchmarks/bench_<old>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import cv2
+
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+QUALITIES = ("high", "low")
+FPS_VALUES = (15, 30)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_frames(width, height, count):
+    from frame_sources import SyntheticFrameSource
+    source = SyntheticFrameSource(width, height)
+    region = source.default_region()
+    return [cv2.cvtColor(source.grab(region), cv2.COLOR_BGRA2BGR) for _ in range(count)]
+
+
+def run_case(width, height, quality, fps, seconds, output_dir):
+    """Benchmark one configuration; meant to run in a fresh process so peak RSS is its own"""
+    from screen_recorder import ScreenRecorder
+    from gif_palette import GifQuantizer
+    from frame_processing import GIF_COLORS
+    from frame_writers import find_ffmpeg
+    from finalize_job import FinalizeJob
+
+    count = int(fps * seconds)
+    frames = synthetic_frames(width, height, count)
+    recorder = ScreenRecorder()
+    recorder.output_dir = output_dir
+    recorder.quality = quality
+    recorder.fps = fps
+    recorder.frames_converted = False
+    # Stages are driven directly, so a job that is never started stands in for finalize
+    job = FinalizeJob(lambda job: None)
+    result = {"width": width, "height": height, "quality": quality, "fps": fps, "frames": count, "stages": {}}
+
+    def stage(name, func, output=None):
+        started = time.perf_counter()
+        # Silence the recorder's progress prints
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        elapsed = time.perf_counter() - started
+        result["stages"][name] = {
+            "seconds": round(elapsed, 4),
+            "frames_per_sec": round(count / elapsed, 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "output_bytes": os.path.getsize(output) if output else None,
+        }
+
+    processed = []
+    stage("process", lambda: processed.extend(recorder.process_frame_chunk(frames, quality)))
+    recorder.frame_repeats = [1] * len(processed)
+
+    def save(name, saver, extension):
+        path = os.path.join(output_dir, f"{name}_{width}x{height}_{quality}_{fps}.{extension}")
+        recorder.processed_frames = processed
+        stage(name, lambda: saver(path, job), path)
+        os.remove(path)
+
+    recorder.gif_quantizer = GifQuantizer(GIF_COLORS.get(quality, 256) - 1, recorder.gif_palette_mode)
+    save("gif", recorder._save_gif, "gif")
+
+    recorder.video_backend = "opencv"
+    save("video_opencv", recorder._save_video, "mp4")
+    if find_ffmpeg():
+        recorder.video_backend = "ffmpeg"
+        save("video_ffmpeg", recorder._save_video, "mp4")
+
+    recorder.thread_pool.shutdown()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(resolutions=RESOLUTIONS, qualities=QUALITIES, fps_values=FPS_VALUES, seconds=2.0,
+                   output_dir="benchmarks"):
+    """Run the grid and write bench_<commit>_<time>.json to output_dir; returns (path, report)"""
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for width, height in resolutions:
+            for quality in qualities:
+                for fps in fps_values:
+                    # Fresh spawned process per case, so peak RSS is not inherited
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                        result = executor.submit(run_case, width, height, quality, fps, seconds, scratch).result()
+                    results.append(result)
+                    summary = ", ".join(f"{name} {s['frames_per_sec']:.0f} fps"
+                                        for name, s in result["stages"].items())
+                    print(f"{width}x{height} {quality} {fps}fps: {summary}", file=sys.stderr)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seconds_per_case": seconds,
+        "results": results,
+    }
+    path = os.path.join(output_dir, f"bench_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path, report
+
+
+def compare(old, new):
+    """Print frames/sec and output size changes between two reports"""
+    def key(result):
+        return result["width"], result["height"], result["quality"], result["fps"]
+
+    old_results = {key(r): r for r in old["results"]}
+    print(f"{old['commit']} -> {new['commit']}")
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None:
+            continue
+        for name, stage in result["stages"].items():
+            previous = before["stages"].get(name)
+            if previous is None:
+                continue
+            speed = stage["frames_per_sec"] / previous["frames_per_sec"]
+            line = f"{'%dx%d %s %dfps' % key(result):<24} {name:<14} {speed:6.2f}x fps"
+            if stage["output_bytes"] and previous["output_bytes"]:
+                line += f"  {stage['output_bytes'] / previous['output_bytes']:6.2f}x size"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark processing and encoding stages")
+    parser.add_argument("--quick", action="store_true", help="only 640x360")
+    parser.add_argument("--seconds", type=float, default=2.0, help="recording length per case (default: 2)")
+    parser.add_argument("--output-dir", default="benchmarks", help="where to write the JSON report")
+    parser.add_argument("--compare", metavar="JSON", help="earlier report to compare the new one against")
+    args = parser.parse_args(argv)
+
+    resolutions = RESOLUTIONS[:1] if args.quick else RESOLUTIONS
+    path, report = run_benchmarks(resolutions, seconds=args.seconds, output_dir=args.output_dir)
+    print(f"Results written to {path}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Headless command-line recording, without the Tk UI.
+
+Examples:
+    python cli.py --region 0,0,1280,720 --duration 10 --format gif --output demo.gif
+    python cli.py --source synthetic --duration 5 --encoder ffmpeg --crf 28
+
+Prints a JSON summary of the recording on stdout; progress messages go to stderr.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from screen_recorder import ScreenRecorder
+from settings import Settings
+from frame_sources import SyntheticFrameSource, ReplayFrameSource
+
+
+def parse_region(text):
+    """"left,top,width,height" -> mss style region dict"""
+    try:
+        left, top, width, height = (int(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("region must be LEFT,TOP,WIDTH,HEIGHT")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("region width and height must be positive")
+    return {"left": left, "top": top, "width": width, "height": height}
+
+
+def primary_monitor_region():
+    """Region of the primary monitor, used when recording the screen without --region"""
+    import mss
+    with mss.mss() as sct:
+        monitor = sct.monitors[1]
+    return {key: monitor[key] for key in ("left", "top", "width", "height")}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Record the screen without the GUI")
+    parser.add_argument("--region", type=parse_region,
+                        help="LEFT,TOP,WIDTH,HEIGHT to record (default: primary monitor)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to record (default: 5)")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--quality", choices=("high", "medium", "low"), default="high")
+    parser.add_argument("--format", choices=("video", "gif"), default="video", dest="format_type")
+    parser.add_argument("--encoder", choices=("auto", "ffmpeg", "opencv"), default="auto",
+                        help="MP4 encoder backend (default: auto)")
+    parser.add_argument("--preset", default="veryfast", help="x264 preset for the ffmpeg encoder")
+    parser.add_argument("--crf", type=int, default=23, help="x264 CRF for the ffmpeg encoder")
+    parser.add_argument("--output", help="output file (default: timestamped file in the recordings folder)")
+    parser.add_argument("--source", choices=("screen", "synthetic"), default="screen",
+                        help="capture the screen or generate deterministic test frames")
+    parser.add_argument("--replay", metavar="PATH", help="replay frames from an MP4/GIF instead of capturing")
+    parser.add_argument("--capture-format", choices=("bgr", "yuv420"), default="bgr",
+                        help="frame layout for video recordings; yuv420 halves buffer memory (default: bgr)")
+    parser.add_argument("--streaming", action="store_true", help="encode while recording")
+    parser.add_argument("--pipeline", choices=("thread", "process"), default="thread")
+    parser.add_argument("--metrics-log", metavar="PATH",
+                        help="append pipeline metrics to this JSON-lines file every second")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome/Perfetto trace of the recording's stages to PATH")
+    parser.add_argument("--frame-memory", type=int, default=1024, metavar="MB",
+                        help="RAM for frames kept until saving; the rest spills to disk (default: 1024)")
+    parser.add_argument("--target-size", type=float, metavar="MB",
+                        help="fit GIFs under this size in megabytes")
+    return parser
+
+
+def record(args):
+    """Run one recording as described by parsed args; returns the summary dict"""
+    recorder = ScreenRecorder()
+    # Tuned by autotune.py, if it has been run
+    recorder.apply_performance_profile(Settings().get_performance_profile())
+    recorder.video_backend = args.encoder
+    recorder.video_preset = args.preset
+    recorder.video_crf = args.crf
+    recorder.metrics_log_path = args.metrics_log
+    recorder.trace_path = args.trace
+    recorder.frame_memory_mb = args.frame_memory
+    recorder.capture_format = args.capture_format
+    if args.output:
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(output_dir, exist_ok=True)
+        recorder.output_dir = output_dir
+
+    if args.replay:
+        source = ReplayFrameSource(args.replay, loop=False)
+    elif args.source == "synthetic":
+        source = SyntheticFrameSource()
+    else:
+        source = None
+    region = args.region
+    if region is None and source is None:
+        region = primary_monitor_region()
+
+    recorder.start_recording(
+        region=region,
+        format_type=args.format_type,
+        fps=args.fps,
+        quality=args.quality,
+        source=source,
+        streaming=args.streaming,
+        pipeline=args.pipeline,
+        target_size=int(args.target_size * 1024 * 1024) if args.target_size else None
+    )
+    started = time.perf_counter()
+    # Replays may run out before the duration is up
+    while time.perf_counter() - started < args.duration and recorder.is_capturing():
+        time.sleep(0.05)
+
+    stopped = time.perf_counter()
+    filepath = recorder.stop_recording()
+    encode_seconds = time.perf_counter() - stopped
+    stats = recorder.get_capture_stats()
+
+    if filepath and args.output:
+        shutil.move(filepath, args.output)
+        filepath = os.path.abspath(args.output)
+
+    return {
+        "success": bool(filepath),
+        "file": filepath,
+        "format": args.format_type,
+        "size_bytes": os.path.getsize(filepath) if filepath else 0,
+        "duration": round(stats["elapsed"], 3),
+        "target_fps": stats["target_fps"],
+        "achieved_fps": round(stats["achieved_fps"], 2),
+        "frames_captured": stats["captured"],
+        "frames_dropped": stats["dropped"],
+        "frames_late": stats["late"],
+        "frames_skipped": stats["skipped"],
+        "encode_seconds": round(encode_seconds, 3),
+        "worker_utilization": recorder.get_metrics()["worker_utilization"],
+    }
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # The recorder reports progress with print(); keep stdout for the JSON summary
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = record(args)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
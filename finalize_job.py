@@ -0,0 +1,78 @@
+import queue
+import threading
+
+
+class FinalizeCancelled(Exception):
+    """Raised inside a finalize job when cancel() was called"""
+
+
+class FinalizeJob:
+    """Runs the end of a recording (draining, encoding, saving) on a background thread.
+
+    The target is called as ``target(job)`` and reports its progress with
+    ``job.report(stage, done, total)``; the updates pile up in a thread-safe
+    queue that the UI drains with poll(). Long loops call
+    ``job.check_cancelled()``, which raises FinalizeCancelled once cancel()
+    has been called. The target's return value (the saved file path, or
+    None) becomes ``job.result``.
+    """
+
+    def __init__(self, target, name="finalize"):
+        self.target = target
+        self.result = None
+        self.error = None
+        self.stage = "queued"
+        self.updates = queue.Queue()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.target(self)
+        except FinalizeCancelled:
+            self.report("cancelled")
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error finalizing recording: {self.error}")
+        finally:
+            self._done.set()
+            self.updates.put(("finished", 0, 0))
+
+    def report(self, stage, done=0, total=0):
+        """Publish progress: a stage name and optional done/total counts"""
+        self.stage = stage
+        self.updates.put((stage, done, total))
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise FinalizeCancelled()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def poll(self):
+        """Progress updates since the last call, oldest first"""
+        updates = []
+        while True:
+            try:
+                updates.append(self.updates.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def wait(self, timeout=None):
+        """Block until finished; returns the result"""
+        self._done.wait(timeout)
+        return self.result
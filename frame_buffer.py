@@ -0,0 +1,132 @@
+import queue
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# What to do when the capture side finds every slot occupied
+DROP_OLDEST = "drop_oldest"    # overwrite the oldest frame still waiting to be processed
+DROP_NEWEST = "drop_newest"    # discard the frame that was just captured
+BLOCK = "block"                # wait for the processing stage to free a slot
+DEGRADE = "degrade"            # halve the capture rate while the buffer is under pressure
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK, DEGRADE)
+
+
+class FrameRingBuffer:
+    """Fixed set of preallocated frame slots shared by capture and processing.
+
+    The capture thread asks for a free slot with ``acquire()``, writes the
+    frame into it in place and publishes it with ``commit()``. The processing
+    stage takes slots in capture order with ``get()`` and hands them back
+    with ``release()`` once it no longer needs the pixels. No frame memory is
+    allocated after construction, and the total is bounded by the budget.
+
+    With ``shared=True`` the slots live in a named shared memory block so
+    worker processes can map the same frames without copying them.
+    """
+
+    def __init__(self, frame_shape, memory_budget_mb=512, policy=DROP_NEWEST,
+                 min_slots=4, max_slots=2000, dtype=np.uint8, shared=False):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        frame_bytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+        capacity = int(memory_budget_mb * 1024 * 1024 // max(frame_bytes, 1))
+        self.capacity = max(min_slots, min(capacity, max_slots))
+        self.policy = policy
+        self.frame_shape = tuple(frame_shape)
+
+        # One contiguous block; each slot is a view into it
+        self.storage_shape = (self.capacity,) + self.frame_shape
+        self.dtype = np.dtype(dtype)
+        self.shm = None
+        if shared:
+            size = int(np.prod(self.storage_shape)) * self.dtype.itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self._storage = np.ndarray(self.storage_shape, dtype=dtype, buffer=self.shm.buf)
+        else:
+            self._storage = np.empty(self.storage_shape, dtype=dtype)
+        self.slots = list(self._storage)
+        self.nbytes = self._storage.nbytes
+
+        self._free = deque(range(self.capacity))
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Frames overwritten before processing under drop_oldest
+        self.evicted = 0
+        # Degrade mode switches on above the high-water mark and off below the low one
+        self.degraded = False
+        self._high_water = max(1, int(self.capacity * 0.75))
+        self._low_water = int(self.capacity * 0.25)
+
+    def __len__(self):
+        """Number of frames waiting to be processed"""
+        return len(self._ready)
+
+    def acquire(self, timeout=None):
+        """Return a free slot index for the next frame, or None if it must be dropped"""
+        with self._cond:
+            if not self._free:
+                if self.policy == DROP_OLDEST and self._ready:
+                    self._free.append(self._ready.popleft())
+                    self.evicted += 1
+                elif self.policy == BLOCK:
+                    self._cond.wait_for(lambda: self._free or self._closed, timeout)
+                    if not self._free:
+                        return None
+                else:
+                    return None
+            return self._free.popleft()
+
+    def commit(self, slot):
+        """Publish a filled slot to the processing stage"""
+        with self._cond:
+            self._ready.append(slot)
+            if len(self._ready) >= self._high_water:
+                self.degraded = self.policy == DEGRADE
+            self._cond.notify_all()
+
+    def discard(self, slot):
+        """Return a slot that was acquired but never filled"""
+        self.release(slot)
+
+    def get(self, timeout=None):
+        """Take the oldest filled slot, raising queue.Empty if none arrives in time"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ready, timeout):
+                raise queue.Empty
+            return self._ready.popleft()
+
+    def release(self, slot):
+        """Hand a slot back for reuse once its pixels are no longer needed"""
+        with self._cond:
+            self._free.append(slot)
+            if len(self._ready) <= self._low_water:
+                self.degraded = False
+            self._cond.notify_all()
+
+    def empty(self):
+        return not self._ready
+
+    def close(self):
+        """Wake any capture thread blocked in acquire()"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def dispose(self):
+        """Free the shared memory block once capture and processing have finished"""
+        if self.shm is None:
+            return
+        # Views into the block must go before it can be closed
+        self.slots = []
+        self._storage = None
+        try:
+            self.shm.close()
+        except BufferError:
+            print("Warning: shared frame buffer still in use, leaving it mapped")
+        self.shm.unlink()
+        self.shm = None
@@ -0,0 +1,75 @@
+import hashlib
+
+import cv2
+import numpy as np
+
+
+class FrameDeduplicator:
+    """Collapses runs of repeated frames into one frame that lasts longer.
+
+    Frames are pushed in capture order. A frame identical to the one before
+    it (same content hash) only extends that frame's duration; with a
+    ``tolerance`` above 0 a frame whose thumbnail differs by at most that
+    much (mean absolute difference, 0-255) counts as a repeat too. Output is
+    ``(frame, repeats)`` pairs, where repeats is the number of capture
+    intervals the frame stays on screen, so playback timing is unchanged.
+    """
+
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+        self._pending = None
+        self._pending_repeats = 0
+        self._pending_digest = None
+        self._pending_thumb = None
+        self.duplicates = 0
+
+    @staticmethod
+    def _digest(frame):
+        # Palette images are compared by their indices and their palette
+        if hasattr(frame, "palette"):
+            data = np.asarray(frame)
+            extra = frame.palette.palette if frame.palette else b""
+        else:
+            data, extra = frame, b""
+        digest = hashlib.blake2b(np.ascontiguousarray(data), digest_size=16)
+        digest.update(extra)
+        return digest.digest()
+
+    @staticmethod
+    def _thumbnail(frame):
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        return small.astype(np.int16)
+
+    def push(self, frame):
+        """Add the next frame; return the pairs that are now final"""
+        digest = self._digest(frame)
+        thumb = None
+        if self._pending is not None:
+            if digest == self._pending_digest:
+                self._pending_repeats += 1
+                self.duplicates += 1
+                return []
+            # Near-duplicate check only makes sense on pixel arrays
+            if self.tolerance > 0 and isinstance(frame, np.ndarray):
+                thumb = self._thumbnail(frame)
+                if np.abs(thumb - self._pending_thumb).mean() <= self.tolerance:
+                    self._pending_repeats += 1
+                    self.duplicates += 1
+                    return []
+
+        done = self.flush()
+        self._pending = frame
+        self._pending_repeats = 1
+        self._pending_digest = digest
+        if self.tolerance > 0 and isinstance(frame, np.ndarray):
+            self._pending_thumb = thumb if thumb is not None else self._thumbnail(frame)
+        return done
+
+    def flush(self):
+        """Return the held frame, if any; call once after the last frame"""
+        if self._pending is None:
+            return []
+        done = [(self._pending, self._pending_repeats)]
+        self._pending = None
+        self._pending_thumb = None
+        return done
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+# Resize factor and GIF palette size for each quality setting
+QUALITY_SCALE = {"high": 1.0, "medium": 0.75, "low": 0.5}
+GIF_COLORS = {"high": 256, "medium": 128, "low": 64}
+
+# Layouts captured frames can be kept in: packed BGR (3 bytes/pixel) or planar
+# YUV 4:2:0 in OpenCV's I420 layout, a (height * 3/2, width) array holding the
+# Y plane followed by the quarter-size U and V planes (1.5 bytes/pixel)
+BGR = "bgr"
+YUV420 = "yuv420"
+
+
+def frame_buffer_shape(width, height, frame_format=BGR):
+    """Array shape of a width x height frame in the given layout"""
+    if frame_format == YUV420:
+        return (height * 3 // 2, width)
+    return (height, width, 3)
+
+
+def frame_size(frame, frame_format=BGR):
+    """(width, height) of the picture held in a frame array"""
+    if frame_format == YUV420:
+        return frame.shape[1], frame.shape[0] * 2 // 3
+    return frame.shape[1], frame.shape[0]
+
+
+def convert_captured(frame_bgra, dst, frame_format=BGR):
+    """Convert a captured BGRA frame into a preallocated buffer of the given layout"""
+    code = cv2.COLOR_BGRA2YUV_I420 if frame_format == YUV420 else cv2.COLOR_BGRA2BGR
+    cv2.cvtColor(frame_bgra, code, dst=dst)
+
+
+def to_bgr(frame, frame_format=BGR):
+    """BGR version of a frame, for consumers that only take BGR"""
+    if frame_format == YUV420:
+        return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+    return frame
+
+
+def _yuv420_planes(frame, width, height):
+    """Y, U and V views of an I420 frame"""
+    chroma = frame[height:].reshape(-1)
+    quarter = (width // 2) * (height // 2)
+    return (frame[:height],
+            chroma[:quarter].reshape(height // 2, width // 2),
+            chroma[quarter:].reshape(height // 2, width // 2))
+
+
+def _resize_yuv420(frame, scale):
+    width, height = frame_size(frame, YUV420)
+    # Chroma is subsampled 2x2, so the result keeps even dimensions
+    new_width = max(2, int(round(width * scale)) // 2 * 2)
+    new_height = max(2, int(round(height * scale)) // 2 * 2)
+    resized = np.empty(frame_buffer_shape(new_width, new_height, YUV420), dtype=frame.dtype)
+    for plane, target in zip(_yuv420_planes(frame, width, height),
+                             _yuv420_planes(resized, new_width, new_height)):
+        target[...] = cv2.resize(plane, (target.shape[1], target.shape[0]), interpolation=cv2.INTER_LINEAR)
+    return resized
+
+
+def resize_for_quality(frame, quality, frame_format=BGR):
+    """Scale a frame down for medium/low quality (returns the input for high)"""
+    scale = QUALITY_SCALE.get(quality, 1.0)
+    if scale == 1.0:
+        return frame
+    if frame_format == YUV420:
+        return _resize_yuv420(frame, scale)
+    return cv2.resize(frame, None, fx=scale, fy=scale)
+
+
+def process_frame(frame, quality, frame_format=BGR):
+    """Processing-stage transform for one captured frame (BGR or YUV420)"""
+    resized = resize_for_quality(frame, quality, frame_format)
+    if resized is frame:
+        # Frames may be ring buffer slots that get reused, so keep a copy
+        resized = frame.copy()
+    return resized
+
+
+def convert_gif_frame(frame, quality, palette=None):
+    """Convert a processed BGR frame to a palette image for GIF output
+
+    The frame is expected at its final size (process_frame already scaled it
+    for the quality). With a GifPalette (see gif_palette.py) it is mapped
+    onto that shared palette; otherwise it gets its own palette from PIL's
+    quantizer, which is also what quality picks the color count for.
+    """
+    if palette is not None:
+        return palette.to_image(palette.map(frame))
+
+    # Convert to RGB and reduce colors for smaller file size
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    img = Image.fromarray(frame_rgb)
+    return img.quantize(colors=GIF_COLORS.get(quality, 256))
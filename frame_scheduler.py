@@ -0,0 +1,108 @@
+import time
+
+
+class FrameScheduler:
+    """Paces frame capture against absolute tick deadlines.
+
+    Tick N is due at ``origin + N * period`` on the monotonic
+    ``perf_counter_ns`` clock, so a slow grab never pushes every later frame
+    back (the old ``next = now + frame_time`` scheme drifted and silently
+    under-delivered FPS). Waiting sleeps for the bulk of the interval and only
+    yields for the last moment instead of busy-polling.
+
+    Accounting:
+    - captured: frames grabbed and handed to the pipeline
+    - late: captured frames that started more than ``late_tolerance`` of a
+      period after their deadline
+    - skipped: ticks that passed entirely without a grab (capture fell behind)
+    - dropped: frames grabbed but thrown away because the pipeline was full
+    """
+
+    # Wake this long before the deadline and yield for the remainder, which
+    # absorbs the OS sleep granularity without spinning for the whole period
+    SPIN_WINDOW_NS = 1_500_000
+
+    def __init__(self, fps, late_tolerance=0.25):
+        self.fps = fps
+        self.period_ns = int(1_000_000_000 / fps)
+        self.late_tolerance_ns = int(self.period_ns * late_tolerance)
+
+        self.origin_ns = None
+        self.next_tick = 0
+        self.stopped_ns = None
+
+        self.timestamps = []
+        self.captured = 0
+        self.late = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start (or resume after stop) so that the next tick is due now"""
+        now = time.perf_counter_ns()
+        if self.origin_ns is None:
+            self.origin_ns = now
+        else:
+            # Resuming: shift the timeline so paused time is neither counted
+            # as skipped ticks nor as capture time
+            self.origin_ns = now - self.next_tick * self.period_ns
+        self.stopped_ns = None
+
+    def stop(self):
+        """Mark the end of a capture run (pause or stop)"""
+        if self.stopped_ns is None:
+            self.stopped_ns = time.perf_counter_ns()
+
+    def wait(self):
+        """Block until the next tick is due and return its index"""
+        deadline = self.origin_ns + self.next_tick * self.period_ns
+        remaining = deadline - time.perf_counter_ns()
+
+        if remaining > self.SPIN_WINDOW_NS:
+            time.sleep((remaining - self.SPIN_WINDOW_NS) / 1_000_000_000)
+        while time.perf_counter_ns() < deadline:
+            time.sleep(0)
+
+        now = time.perf_counter_ns()
+        behind = (now - deadline) // self.period_ns
+        if behind > 0:
+            # Whole periods went by without a grab; jump to the current tick
+            self.skipped += behind
+            self.next_tick += behind
+            deadline += behind * self.period_ns
+        if now - deadline > self.late_tolerance_ns:
+            self.late += 1
+
+        tick = self.next_tick
+        self.next_tick += 1
+        return tick
+
+    def record_capture(self, timestamp_ns):
+        """Record a frame that was grabbed and queued"""
+        self.timestamps.append(timestamp_ns)
+        self.captured += 1
+
+    def record_drop(self):
+        """Record a frame that was grabbed but could not be queued"""
+        self.dropped += 1
+
+    def elapsed_seconds(self):
+        """Capture time so far, excluding pauses"""
+        if self.origin_ns is None:
+            return 0.0
+        end = self.stopped_ns if self.stopped_ns is not None else time.perf_counter_ns()
+        # origin_ns is rebased on every resume, so this already excludes pauses
+        return max(end - self.origin_ns, 0) / 1_000_000_000
+
+    def stats(self):
+        """Summary of what was delivered against what was asked for"""
+        elapsed = self.elapsed_seconds()
+        return {
+            "target_fps": self.fps,
+            "achieved_fps": self.captured / elapsed if elapsed > 0 else 0.0,
+            "elapsed": elapsed,
+            "captured": self.captured,
+            "late": self.late,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+        }
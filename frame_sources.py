@@ -0,0 +1,193 @@
+import cv2
+import numpy as np
+import imageio
+import mss
+
+
+class FrameSource:
+    """Base class for anything ScreenRecorder can capture frames from.
+
+    A source returns BGRA uint8 arrays of shape (height, width, 4), the same
+    layout ``np.array(mss.mss().grab(region))`` produces, so every stage after
+    capture behaves identically whichever source is used.
+    """
+
+    # Set by sources with a finite amount of content once it has run out
+    finished = False
+
+    def default_region(self):
+        """Region to record when the caller did not pick one (None = ask the user)"""
+        return None
+
+    def grab(self, region):
+        """Return the next frame for the given region as a BGRA array"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the source"""
+        pass
+
+
+class MSSFrameSource(FrameSource):
+    """Live screen capture through mss"""
+
+    def __init__(self, sct=None):
+        self.sct = sct
+
+    def grab(self, region):
+        # mss handles are not shareable between threads on every platform,
+        # so create it lazily on the capture thread if none was given
+        if self.sct is None:
+            self.sct = mss.mss()
+        return np.array(self.sct.grab(region))
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+
+class SyntheticFrameSource(FrameSource):
+    """Deterministic generated content for headless runs and benchmarks.
+
+    Produces scrolling lines of text next to a moving textured "video"
+    strip, which exercises both the sharp-edge and smooth-color paths of the
+    encoders. The same seed and frame index always produce the same pixels.
+    """
+
+    def __init__(self, width=1280, height=720, seed=0, scroll_speed=4):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.scroll_speed = scroll_speed
+        self.frame_index = 0
+
+        rng = np.random.default_rng(seed)
+        # Background texture the "video" strip scrolls over
+        self._texture = rng.integers(0, 256, size=(height, 64, 3), dtype=np.uint8)
+        self._texture = cv2.resize(self._texture, (width, height), interpolation=cv2.INTER_CUBIC)
+
+        # Pre-render a tall text page once; frames are windows into it
+        line_height = 24
+        lines = max(height // line_height * 2, 1)
+        self._page = np.full((lines * line_height, width, 4), 255, dtype=np.uint8)
+        words = ["screen", "recorder", "frame", "capture", "gif", "video",
+                 "pipeline", "encode", "region", "upload", "quality", "fps"]
+        for i in range(lines):
+            count = int(rng.integers(3, 10))
+            text = " ".join(words[int(j)] for j in rng.integers(0, len(words), size=count))
+            cv2.putText(self._page, f"{i:04d} {text}", (8, i * line_height + 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (40, 40, 40, 255), 1, cv2.LINE_AA)
+
+        self._frame = np.empty((height, width, 4), dtype=np.uint8)
+
+    def default_region(self):
+        return {"left": 0, "top": 0, "width": self.width, "height": self.height}
+
+    def grab(self, region):
+        t = self.frame_index
+        self.frame_index += 1
+
+        frame = self._frame
+        split = self.width // 2
+
+        # Left half: text page scrolling upwards
+        page_height = self._page.shape[0]
+        rows = (np.arange(self.height) + t * self.scroll_speed) % page_height
+        frame[:, :split] = self._page[rows, :split]
+
+        # Right half: moving texture with a bouncing box, like video content
+        shift = (t * self.scroll_speed) % self.width
+        video = np.roll(self._texture[:, split:], shift, axis=1)
+        frame[:, split:, :3] = video
+        frame[:, split:, 3] = 255
+        box = 40
+        span_x = max(self.width - split - box, 1)
+        span_y = max(self.height - box, 1)
+        x = split + abs((t * 7) % (2 * span_x) - span_x)
+        y = abs((t * 5) % (2 * span_y) - span_y)
+        frame[y:y + box, x:x + box] = (0, 0, 255, 255)
+
+        top = min(region.get("top", 0), self.height - 1)
+        left = min(region.get("left", 0), self.width - 1)
+        return frame[top:top + region["height"], left:left + region["width"]].copy()
+
+
+class ReplayFrameSource(FrameSource):
+    """Feed frames from an existing MP4/GIF, e.g. a customer's recording"""
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.reader = None
+        self._open()
+        first = self._next_frame()
+        if first is None:
+            raise Exception(f"No frames could be read from {path}")
+        self.height, self.width = first.shape[:2]
+        self._pending = first
+
+    def _open(self):
+        self.close()
+        # OpenCV decodes MP4 without extra plugins; imageio handles GIF frames
+        if self.path.lower().endswith(".gif"):
+            self.reader = imageio.get_reader(self.path)
+            self._iter = iter(self.reader)
+        else:
+            self.reader = cv2.VideoCapture(self.path)
+            if not self.reader.isOpened():
+                raise Exception(f"Could not open {self.path} for replay")
+            self._iter = None
+
+    def _read(self):
+        if self._iter is None:
+            ok, frame = self.reader.read()
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA) if ok else None
+        try:
+            frame = np.asarray(next(self._iter))
+        except StopIteration:
+            return None
+        if frame.ndim == 2:
+            return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGRA)
+        if frame.shape[2] == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGRA)
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGRA)
+
+    def _next_frame(self):
+        frame = self._read()
+        if frame is None and self.loop:
+            self._open()
+            frame = self._read()
+        return frame
+
+    def default_region(self):
+        return {"left": 0, "top": 0, "width": self.width, "height": self.height}
+
+    def grab(self, region):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+        else:
+            frame = self._next_frame()
+            if frame is None:
+                self.finished = True
+                return None
+        # Frames in a GIF can be smaller than the canvas; pad to a fixed size
+        if frame.shape[0] != self.height or frame.shape[1] != self.width:
+            padded = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+            h = min(frame.shape[0], self.height)
+            w = min(frame.shape[1], self.width)
+            padded[:h, :w] = frame[:h, :w]
+            frame = padded
+        top = region.get("top", 0) if region else 0
+        left = region.get("left", 0) if region else 0
+        height = region["height"] if region else self.height
+        width = region["width"] if region else self.width
+        return frame[top:top + height, left:left + width]
+
+    def close(self):
+        if self.reader is not None:
+            if self._iter is None:
+                self.reader.release()
+            else:
+                self.reader.close()
+            self.reader = None
@@ -0,0 +1,170 @@
+import mmap
+import os
+import queue
+import threading
+import uuid
+import zlib
+
+import numpy as np
+from PIL import Image
+
+
+class FrameStore:
+    """Processed frames of a recording, kept in RAM up to a budget and spilled to disk beyond it.
+
+    Behaves like the list it replaces for the encoders: append(), len(),
+    indexing and slicing, in capture order. Frames (BGR arrays, or "P" mode
+    PIL images when they were already quantized) stay in memory until
+    memory_budget_mb is used up; every later frame is zlib-compressed at a
+    fast level and appended to a spill file in spill_dir. Compression and
+    writing run on their own thread (zlib releases the GIL), behind a short
+    queue, so a slow disk pushes back on processing instead of piling up
+    frames. Reading maps the spill file and decompresses one frame at a
+    time, so encoding a long recording stays within the budget too.
+
+    Screen content usually compresses 10x or more, so an hour of 1080p
+    needs a few GB of disk rather than hundreds of GB of RAM. close()
+    deletes the spill file.
+    """
+
+    COMPRESS_LEVEL = 1
+
+    def __init__(self, spill_dir, memory_budget_mb=1024, queue_size=8):
+        self.spill_dir = spill_dir
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.spill_path = None
+        self.error = None
+        self._memory = []
+        # (offset, length, shape, palette length or None) per spilled frame
+        self._records = []
+        self._spilled = 0
+        self._file = None
+        self._map = None
+        # Encoders read from several pool threads; guards (re)mapping the file
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+
+    def __len__(self):
+        return len(self._memory) + self._spilled
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+        if index < len(self._memory):
+            return self._memory[index]
+        return self._read(index - len(self._memory))
+
+    @staticmethod
+    def _frame_bytes(frame):
+        # Arrays know their size; PIL palette images hold a byte per pixel
+        return getattr(frame, "nbytes", None) or frame.width * frame.height
+
+    def append(self, frame):
+        if not self._spilled and self.memory_bytes + self._frame_bytes(frame) <= self.memory_budget:
+            self._memory.append(frame)
+            self.memory_bytes += self._frame_bytes(frame)
+            return
+        if self.error:
+            # The spill file failed; the error is raised when the frames are read
+            return
+        if self._writer is None:
+            self._start_spilling()
+        self._spilled += 1
+        self._queue.put(frame)
+
+    def _start_spilling(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.spill_path = os.path.join(self.spill_dir, f"frames_{uuid.uuid4().hex[:12]}.spill")
+        self._file = open(self.spill_path, "w+b")
+        self._writer = threading.Thread(target=self._write_spilled, name="frame-spill", daemon=True)
+        self._writer.start()
+        print(f"Frame memory budget of {self.memory_budget // (1024 * 1024)} MB reached, "
+              f"spilling frames to {self.spill_path}")
+
+    def _write_spilled(self):
+        offset = 0
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    self._file.flush()
+                    return
+                if self.error:
+                    continue
+                if isinstance(frame, np.ndarray):
+                    palette = b""
+                    pixels = np.ascontiguousarray(frame)
+                    record_palette = None
+                else:
+                    palette = bytes(frame.getpalette() or [])
+                    pixels = np.asarray(frame)
+                    record_palette = len(palette)
+                data = zlib.compress(palette + pixels.tobytes(), self.COMPRESS_LEVEL)
+                self._file.write(data)
+                self._records.append((offset, len(data), pixels.shape, record_palette))
+                offset += len(data)
+                self.spilled_bytes = offset
+            except Exception as e:
+                self.error = f"Could not write spill file: {str(e)}"
+                print(self.error)
+            finally:
+                self._queue.task_done()
+
+    def _read(self, spilled_index):
+        if spilled_index >= len(self._records):
+            # Written but not yet flushed (or still queued); wait for the writer
+            self._queue.join()
+            self._file.flush()
+            if self.error:
+                raise OSError(self.error)
+        offset, length, shape, palette_length = self._records[spilled_index]
+        with self._read_lock:
+            if self._map is None or offset + length > len(self._map):
+                # Records are published as soon as they are written, possibly
+                # before the bytes have left the file's write buffer
+                self._file.flush()
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            compressed = self._map[offset:offset + length]
+        data = zlib.decompress(compressed)
+        if palette_length is None:
+            return np.frombuffer(data, dtype=np.uint8).reshape(shape)
+        image = Image.fromarray(np.frombuffer(data, dtype=np.uint8, offset=palette_length).reshape(shape))
+        image.putpalette(data[:palette_length])
+        return image
+
+    def close(self):
+        """Drop all frames and delete the spill file"""
+        self._memory = []
+        self._records = []
+        self._spilled = 0
+        self.memory_bytes = 0
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
@@ -0,0 +1,276 @@
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from frame_processing import BGR, YUV420, to_bgr
+
+
+class VideoFrameWriter:
+    """MP4 writer that accepts frames one at a time
+
+    OpenCV only encodes BGR, so YUV420 frames are converted on the way in.
+    """
+
+    def __init__(self, filepath, fps, size, frame_format=BGR):
+        self.filepath = filepath
+        self.size = size
+        self.frame_format = frame_format
+        self.frames_written = 0
+
+        # Create video writer with FFmpeg codec, falling back to H.264 if the
+        # MPEG-4 encoder is unavailable in this OpenCV build
+        self.out = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        if not self.out.isOpened():
+            print("Failed to create video writer!")
+            self.out = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'avc1'), fps, size)
+        if not self.out.isOpened():
+            raise Exception(f"Could not open video writer for {filepath}")
+
+    def write(self, frame, repeats=1):
+        """Write a frame that lasts repeats frame intervals
+
+        MP4 from OpenCV is constant frame rate, so a held frame is written
+        repeatedly; the encoder turns the repeats into tiny skip frames.
+        """
+        frame = to_bgr(frame, self.frame_format)
+        for _ in range(repeats):
+            self.out.write(frame)
+        self.frames_written += repeats
+
+    def close(self):
+        self.out.release()
+
+
+def find_ffmpeg():
+    """Path to an ffmpeg binary: the one bundled with imageio-ffmpeg, else PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which("ffmpeg")
+
+
+def _ebml(element_id, payload):
+    """One Matroska (EBML) element: id, 8-byte size, payload"""
+    return element_id + (len(payload) | 1 << 56).to_bytes(8, "big") + payload
+
+
+def _ebml_uint(element_id, value):
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+class FFmpegFrameWriter:
+    """H.264 MP4 writer that pipes raw frames to an ffmpeg process.
+
+    Frames are BGR or, with frame_format=YUV420, I420 planes that ffmpeg
+    takes as yuv420p as they are, which is half the bytes through the pipe
+    and no conversion on either side for yuv420p output.
+
+    libx264 gives much smaller files than OpenCV's MPEG-4 writer at the same
+    quality, and encodes on its own threads (threads=0 uses every core) while
+    the recorder only copies bytes into the pipe. preset trades speed for
+    size, crf sets the quality (lower is better, 23 is x264's default).
+
+    The output is variable frame rate: frames go through the pipe wrapped in
+    a minimal Matroska stream that carries each frame's timestamp, so a
+    frame held for several intervals is piped and encoded once.
+    """
+
+    def __init__(self, filepath, fps, size, preset="veryfast", crf=23, threads=0,
+                 pix_fmt="yuv420p", ffmpeg=None, frame_format=BGR):
+        self.filepath = filepath
+        self.size = size
+        self.frames_written = 0
+        self._last_frame = None
+
+        ffmpeg = ffmpeg or find_ffmpeg()
+        if not ffmpeg:
+            raise Exception("ffmpeg not found; install imageio-ffmpeg or add ffmpeg to PATH")
+
+        width, height = size
+        command = [ffmpeg, "-y", "-loglevel", "error", "-f", "matroska", "-i", "-", "-an"]
+        if pix_fmt in ("yuv420p", "yuv422p"):
+            # Chroma subsampled formats need even dimensions; drop the odd row/column
+            command += ["-vf", f"crop={width - width % 2}:{height - height % 2}:0:0"]
+        command += [
+            # Timestamps in whole capture intervals, but held frames are not duplicated
+            "-r", str(fps), "-vsync", "vfr", "-video_track_timescale", "90000",
+            # B-frames reorder around long gaps and break the MP4 edit list, dropping the last frame
+            "-bf", "0",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-threads", str(threads),
+            "-pix_fmt", pix_fmt, "-movflags", "+faststart", filepath,
+        ]
+        # No console window flashing up on Windows
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        self.fps = fps
+        self._pipe(self._stream_header(width, height, frame_format))
+
+    @staticmethod
+    def _stream_header(width, height, frame_format):
+        """Matroska header for one uncompressed video track with millisecond timestamps"""
+        header = _ebml(b"\x1a\x45\xdf\xa3", b"".join([
+            _ebml_uint(b"\x42\x86", 1), _ebml_uint(b"\x42\xf7", 1),
+            _ebml_uint(b"\x42\xf2", 4), _ebml_uint(b"\x42\xf3", 8),
+            _ebml(b"\x42\x82", b"matroska"), _ebml_uint(b"\x42\x87", 4), _ebml_uint(b"\x42\x85", 2),
+        ]))
+        # Segment of unknown size, since it is streamed
+        header += b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff"
+        header += _ebml(b"\x15\x49\xa9\x66", _ebml_uint(b"\x2a\xd7\xb1", 1000000))
+        # Raw pixel layout as a fourcc, the way ffmpeg names raw formats
+        fourcc = b"I420" if frame_format == YUV420 else b"BGR\x18"
+        video = _ebml_uint(b"\xb0", width) + _ebml_uint(b"\xba", height) + _ebml(b"\x2e\xb5\x24", fourcc)
+        track = b"".join([
+            _ebml_uint(b"\xd7", 1), _ebml_uint(b"\x73\xc5", 1), _ebml_uint(b"\x83", 1),
+            _ebml(b"\x86", b"V_UNCOMPRESSED"), _ebml(b"\xe0", video),
+        ])
+        return header + _ebml(b"\x16\x54\xae\x6b", _ebml(b"\xae", track))
+
+    def _pipe(self, data):
+        try:
+            self.proc.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            # ffmpeg exited early; surface its own error message
+            self.proc.wait()
+            raise Exception(f"ffmpeg stopped: {self.proc.stderr.read().decode(errors='replace').strip()}")
+
+    def _write_block(self, interval, data):
+        """One cluster holding one keyframe block, shown from capture interval number interval on"""
+        cluster_time = _ebml_uint(b"\xe7", round(interval * 1000 / self.fps))
+        # Track 1, timecode relative to the cluster, keyframe flag
+        block_header = b"\x81\x00\x00\x80"
+        block_size = len(block_header) + len(data)
+        self._pipe(b"\x1f\x43\xb6\x75" + (len(cluster_time) + 9 + block_size | 1 << 56).to_bytes(8, "big")
+                   + cluster_time + b"\xa3" + (block_size | 1 << 56).to_bytes(8, "big") + block_header)
+        self._pipe(data)
+
+    def write(self, frame, repeats=1):
+        """Write a frame that lasts repeats frame intervals"""
+        data = memoryview(np.ascontiguousarray(frame)).cast("B")
+        self._write_block(self.frames_written, data)
+        self._last_frame = (data, repeats)
+        self.frames_written += repeats
+
+    def close(self):
+        if self._last_frame is not None and self._last_frame[1] > 1:
+            # A frame's duration comes from the next timestamp; repeat the
+            # last one at the end so it is shown for its full time
+            self._write_block(self.frames_written - 1, self._last_frame[0])
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        errors = self.proc.stderr.read().decode(errors="replace").strip()
+        if self.proc.wait() != 0:
+            raise Exception(f"ffmpeg failed: {errors}")
+
+
+def open_video_writer(filepath, fps, size, backend="auto", frame_format=BGR, **options):
+    """Open an MP4 writer for backend "ffmpeg", "opencv" or "auto"
+
+    "auto" uses ffmpeg when a binary can be found and OpenCV otherwise.
+    frame_format is the layout of the frames that will be written (BGR or
+    YUV420); options (preset, crf, threads, pix_fmt) only apply to ffmpeg.
+    """
+    if backend in ("auto", "ffmpeg"):
+        ffmpeg = find_ffmpeg()
+        if ffmpeg or backend == "ffmpeg":
+            return FFmpegFrameWriter(filepath, fps, size, ffmpeg=ffmpeg, frame_format=frame_format, **options)
+    return VideoFrameWriter(filepath, fps, size, frame_format)
+
+
+class GifFrameWriter:
+    """GIF writer that encodes palette images to disk as they arrive.
+
+    PIL's ``save(append_images=...)`` needs every frame up front; this writes
+    the header with the first frame and then appends one image block per
+    call, so memory stays flat however long the recording is.
+
+    With ``delta=True`` a frame that shares the previous frame's palette is
+    written as just the bounding box of the pixels that changed, with the
+    unchanged pixels inside it marked transparent, on top of the previous
+    frame (disposal 1). Mostly static screen recordings shrink dramatically.
+    """
+
+    def __init__(self, filepath, duration, loop=0, delta=True):
+        self.filepath = filepath
+        self.duration = duration
+        self.loop = loop
+        self.delta = delta
+        self.frames_written = 0
+        # A path, or an already open binary file object (e.g. BytesIO for trial encodes)
+        self._owns_fp = isinstance(filepath, str)
+        self.fp = open(filepath, "wb") if self._owns_fp else filepath
+        self.global_palette = None
+        self._previous = None
+        self._previous_palette = None
+
+    @staticmethod
+    def _transparent_index(palette):
+        """First unused slot in the GIF color table for this palette, if any"""
+        colors = len(palette) // 3
+        # GIF color tables hold a power of two entries (at least 2)
+        table_size = 2
+        while table_size < colors:
+            table_size *= 2
+        return colors if colors < table_size else None
+
+    def write(self, img, duration=None):
+        """Append a "P" mode image (e.g. from Image.quantize)"""
+        palette = img.palette.palette
+        if self.global_palette is None:
+            header, _ = GifImagePlugin.getheader(img, info={"loop": self.loop, "duration": self.duration})
+            for block in header:
+                self.fp.write(block)
+            self.global_palette = palette
+
+        indices = np.asarray(img)
+        # GIF delays are 16-bit centiseconds, so cap very long idle stretches
+        duration = min(duration or self.duration, 65535 * 10)
+        params = {"duration": duration, "disposal": 1}
+        offset = (0, 0)
+        if palette != self.global_palette:
+            # Frames quantized on their own get a local color table
+            params["include_color_table"] = True
+
+        if (self.delta and self._previous is not None and palette == self._previous_palette
+                and indices.shape == self._previous.shape):
+            img, offset, transparency = self._delta_frame(indices, palette)
+            if transparency is not None:
+                params["transparency"] = transparency
+
+        for block in GifImagePlugin.getdata(img, offset, **params):
+            self.fp.write(block)
+        self._previous = indices
+        self._previous_palette = palette
+        self.frames_written += 1
+
+    def _delta_frame(self, indices, palette):
+        """Crop to the changed pixels and make unchanged ones transparent"""
+        changed = indices != self._previous
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            # Nothing changed: a single transparent pixel keeps the timing
+            top = bottom = left = right = 0
+        else:
+            cols = np.flatnonzero(changed.any(axis=0))
+            top, bottom = rows[0], rows[-1]
+            left, right = cols[0], cols[-1]
+
+        crop = indices[top:bottom + 1, left:right + 1].copy()
+        transparency = self._transparent_index(palette)
+        if transparency is not None:
+            crop[~changed[top:bottom + 1, left:right + 1]] = transparency
+
+        frame = Image.fromarray(crop)
+        frame.putpalette(palette)
+        return frame, (int(left), int(top)), transparency
+
+    def close(self):
+        if self.global_palette is not None:
+            self.fp.write(b";")  # GIF trailer
+        if self._owns_fp:
+            self.fp.close()
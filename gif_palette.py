@@ -0,0 +1,199 @@
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Bits kept per channel when looking colors up; 5 bits = 32x32x32 table
+LUT_BITS = 5
+
+
+class GifPalette:
+    """A fixed palette with a precomputed RGB -> palette index lookup table.
+
+    Mapping a frame is then a couple of shifts and one table lookup per
+    pixel in NumPy, instead of running PIL's quantizer on every frame.
+    """
+
+    def __init__(self, colors_rgb):
+        self.colors = np.asarray(colors_rgb, dtype=np.uint8).reshape(-1, 3)
+        self.palette_bytes = self.colors.tobytes()
+        self.lut = self._build_lut(self.colors)
+
+    @staticmethod
+    def _build_lut(colors):
+        """Nearest palette entry for the center of every LUT cell"""
+        size = 1 << LUT_BITS
+        step = 256 // size
+        centers = np.arange(size, dtype=np.float32) * step + step // 2
+        # Cells ordered (b, g, r) so the flat index matches the keys built in map()
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+        palette = colors.astype(np.float32)
+
+        # |c - p|^2 = |c|^2 - 2 c.p + |p|^2; |c|^2 is the same for every p
+        dist = (palette * palette).sum(axis=1)[None, :] - 2.0 * (cells @ palette.T)
+        return dist.argmin(axis=1).astype(np.uint8)
+
+    def map(self, frame_bgr):
+        """Return palette indices (h, w) for a BGR frame (see GifFrameKernel for batches)"""
+        return GIF_KERNEL.indices([frame_bgr], [self])[0]
+
+    def to_image(self, indices):
+        """Wrap palette indices as a "P" mode PIL image"""
+        img = Image.fromarray(indices)
+        img.putpalette(self.palette_bytes)
+        return img
+
+
+def build_palette(frames, colors, max_samples=16, sample_pixels=160 * 120, start=0, end=None):
+    """Build one palette from an evenly spaced sample of the BGR frames[start:end]
+
+    Only the sampled frames are read, so frames can be a FrameStore.
+    """
+    end = len(frames) if end is None else end
+    if end - start > max_samples:
+        picks = np.linspace(start, end - 1, max_samples).astype(int)
+    else:
+        picks = range(start, end)
+
+    tiles = []
+    for index in picks:
+        frame = frames[index]
+        height, width = frame.shape[:2]
+        # Subsample rather than average so only colors really on screen are seen
+        step = max(1, int((height * width / float(sample_pixels)) ** 0.5))
+        tiles.append(frame[::step, ::step].reshape(-1, 3))
+
+    # PIL's median cut on the stacked samples, done once instead of per frame
+    pixels = np.ascontiguousarray(np.concatenate(tiles)[:, ::-1])
+    mosaic = Image.fromarray(pixels.reshape(-1, 1, 3))
+    quantized = mosaic.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()[:colors * 3]
+    return GifPalette(np.array(palette[:len(palette) // 3 * 3], dtype=np.uint8))
+
+
+class GifQuantizer:
+    """Assigns frames to a shared palette, or to one palette per scene.
+
+    ``assign()`` can be called once with every frame (buffered export) or
+    repeatedly with consecutive batches (streaming); each call returns the
+    palette to use for each frame. In "scene" mode a new palette is built
+    whenever the color make-up of a frame differs enough from the first frame
+    of the current scene (scrolling or moving content alone does not count).
+    """
+
+    def __init__(self, colors, mode="scene", scene_threshold=0.35):
+        self.colors = colors
+        self.mode = mode
+        self.scene_threshold = scene_threshold
+        self.palette = None
+        self._scene_hist = None
+
+    @staticmethod
+    def _color_histogram(frame):
+        """Normalized 4x4x4 color histogram of a subsampled frame"""
+        height, width = frame.shape[:2]
+        step = max(1, int((height * width / 4096.0) ** 0.5))
+        small = frame[::step, ::step] >> 6
+        bins = (small[..., 0].astype(np.int32) << 4) | (small[..., 1] << 2) | small[..., 2]
+        hist = np.bincount(bins.ravel(), minlength=64).astype(np.float32)
+        return hist / hist.sum()
+
+    def assign(self, frames, start=0, end=None):
+        """Palette for each of frames[start:end], read one frame at a time"""
+        end = len(frames) if end is None else end
+        if end <= start:
+            return []
+        if self.mode != "scene":
+            if self.palette is None:
+                self.palette = build_palette(frames, self.colors, start=start, end=end)
+            return [self.palette] * (end - start)
+
+        # Split the batch where the content changes (or where no scene exists yet)
+        starts = []
+        for i in range(start, end):
+            hist = self._color_histogram(frames[i])
+            # Half the L1 distance = share of pixels that moved to another color bin
+            if self._scene_hist is None or np.abs(hist - self._scene_hist).sum() / 2 > self.scene_threshold:
+                starts.append(i)
+                self._scene_hist = hist
+
+        palettes = []
+        bounds = starts + [end]
+        if not starts or starts[0] > start:
+            # Batch continues the scene from the previous call
+            palettes.extend([self.palette] * (bounds[0] - start))
+        for scene_start, scene_end in zip(bounds, bounds[1:]):
+            self.palette = build_palette(frames, self.colors, start=scene_start, end=scene_end)
+            palettes.extend([self.palette] * (scene_end - scene_start))
+        return palettes
+
+
+def _key_tables():
+    """Tables giving each channel's share of a LUT key (see GifFrameKernel)
+
+    One for the blue channel alone, indexed by its 8-bit value, and one for
+    green and red together, indexed by the little-endian uint16 of the two
+    adjacent bytes (g | r << 8).
+    """
+    shift = 8 - LUT_BITS
+    values = np.arange(256, dtype=np.uint16) >> shift
+    blue = values << (2 * LUT_BITS)
+    pairs = np.arange(65536, dtype=np.uint32)
+    green_red = ((((pairs & 255) >> shift) << LUT_BITS) | ((pairs >> 8) >> shift)).astype(np.uint16)
+    return blue, green_red
+
+
+class GifFrameKernel:
+    """Batched BGR/BGRA -> palette index conversion with reused scratch buffers"""
+
+    def __init__(self):
+        # Scratch buffers are per thread, so one kernel can serve a thread pool
+        self._local = threading.local()
+        self._blue, self._green_red = _key_tables()
+
+    def _scratch(self, name, shape, dtype):
+        buffers = self._local.__dict__.setdefault("buffers", {})
+        key = (name, shape)
+        if key not in buffers:
+            buffers[key] = np.empty(shape, dtype=dtype)
+        return buffers[key]
+
+    @staticmethod
+    def _green_red_view(frame):
+        """Green and red byte of every pixel as one uint16, without copying"""
+        if frame.strides[2] != 1 or not frame.flags.c_contiguous:
+            frame = np.ascontiguousarray(frame)
+        return np.ndarray(frame.shape[:2], dtype="<u2", buffer=frame, offset=1, strides=frame.strides[:2])
+
+    def indices(self, frames, palettes, scale=1.0, interpolation=cv2.INTER_LINEAR):
+        """Palette indices (n, h, w) for same-sized frames, each mapped onto its palette"""
+        height, width, channels = frames[0].shape
+        if scale != 1.0:
+            width, height = max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+        out = np.empty((len(frames), height, width), dtype=np.uint8)
+        keys = self._scratch("keys", (height, width), np.uint16)
+        blue = self._scratch("blue", (height, width), np.uint16)
+        for frame, palette, target in zip(frames, palettes, out):
+            if scale != 1.0:
+                resized = self._scratch("resized", (height, width, channels), np.uint8)
+                frame = cv2.resize(frame, (width, height), dst=resized, interpolation=interpolation)
+            # Green and red share of the LUT key in one lookup, blue's from its own table
+            np.take(self._green_red, self._green_red_view(frame), out=keys)
+            np.take(self._blue, frame[..., 0], out=blue)
+            np.bitwise_or(keys, blue, out=keys)
+            # Straight into the batch's output; nothing else is allocated per frame
+            np.take(palette.lut, keys, out=target)
+        return out
+
+    def convert(self, frames, palettes, scale=1.0, interpolation=cv2.INTER_LINEAR):
+        """"P" mode images for frames, each mapped onto its palette"""
+        if not len(frames):
+            return []
+        indices = self.indices(frames, palettes, scale, interpolation)
+        return [palette.to_image(frame_indices) for frame_indices, palette in zip(indices, palettes)]
+
+
+# Shared by everything in this process that maps frames onto palettes
+GIF_KERNEL = GifFrameKernel()
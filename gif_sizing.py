@@ -0,0 +1,203 @@
+import io
+import math
+
+import cv2
+import numpy as np
+
+from frame_processing import GIF_COLORS
+from frame_writers import GifFrameWriter
+from gif_palette import GifQuantizer, GIF_KERNEL
+
+# Knobs searched when a GIF has to fit a byte budget, best quality first
+SCALES = (1.0, 0.85, 0.7, 0.6, 0.5, 0.4, 0.3, 0.25)
+COLOR_COUNTS = (256, 128, 64, 32, 16)
+FRAME_STEPS = (1, 2, 3, 4, 6)
+TOLERANCES = (0, 2, 4, 8)
+
+
+class GifSizeFitter:
+    """Picks GIF export settings that land just under a byte budget.
+
+    Output size is estimated from trial encodes of a few short windows of
+    the recording (delta frames depend on their neighbours, so windows are
+    contiguous), scaled up to the full frame count. A simple size model over
+    scale, color count, frame step and near-duplicate tolerance proposes the
+    best-looking settings that should fit, and each proposal is checked with
+    another trial encode, so the whole recording is normally encoded once.
+
+    With a FinalizeJob, encoding checks for cancellation every chunk and the
+    final export reports its progress.
+    """
+
+    def __init__(self, frames, repeats, quality, base_duration, target_bytes,
+                 palette_mode="scene", executor=None, margin=0.95, windows=4, window_length=8, job=None):
+        self.frames = frames
+        self.repeats = repeats
+        self.quality = quality
+        self.base_duration = base_duration
+        self.target_bytes = target_bytes
+        self.palette_mode = palette_mode
+        self.executor = executor
+        self.margin = margin
+        self.windows = windows
+        self.window_length = window_length
+        self.job = job
+
+        self.max_colors = GIF_COLORS.get(quality, 256)
+        self._palettes = {}
+        self._thumbs = {}
+
+    def _candidates(self):
+        for scale in SCALES:
+            for colors in COLOR_COUNTS:
+                if colors > self.max_colors:
+                    continue
+                for step in FRAME_STEPS:
+                    for tolerance in TOLERANCES:
+                        yield {"scale": scale, "colors": colors, "frame_step": step, "tolerance": tolerance}
+
+    def _size_factor(self, params):
+        """Rough relative output size of params compared to full quality"""
+        colors = math.log2(params["colors"]) / math.log2(self.max_colors)
+        return (params["scale"] ** 2) * colors / (params["frame_step"] ** 0.8) * (1 - 0.03 * params["tolerance"])
+
+    @staticmethod
+    def _score(params):
+        """How good params look; sharpness matters most for screen content"""
+        return (3.0 * math.log(params["scale"]) + 0.5 * math.log(params["colors"])
+                - 1.2 * math.log(params["frame_step"]) - 0.1 * params["tolerance"])
+
+    def _palettes_for(self, colors):
+        """Palette per source frame for a color count (one spare index for transparency)"""
+        if colors not in self._palettes:
+            if self.job is not None:
+                self.job.check_cancelled()
+            quantizer = GifQuantizer(colors - 1, self.palette_mode)
+            self._palettes[colors] = quantizer.assign(self.frames)
+        return self._palettes[colors]
+
+    def _thumbnail(self, index):
+        if index not in self._thumbs:
+            small = cv2.resize(self.frames[index], (32, 18), interpolation=cv2.INTER_AREA)
+            self._thumbs[index] = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+        return self._thumbs[index]
+
+    def timeline(self, frame_step, tolerance):
+        """Frames to export as [frame index, capture intervals] at the reduced rate"""
+        picks = []
+        time = next_sample = 0
+        for index, repeats in enumerate(self.repeats):
+            end = time + repeats
+            while next_sample < end:
+                if picks and picks[-1][0] == index:
+                    picks[-1][1] += frame_step
+                else:
+                    picks.append([index, frame_step])
+                next_sample += frame_step
+            time = end
+
+        if tolerance <= 0 or not picks:
+            return picks
+        # Merge frames that barely differ from the start of their run
+        merged = [picks[0]]
+        for index, units in picks[1:]:
+            if np.abs(self._thumbnail(index) - self._thumbnail(merged[-1][0])).mean() <= tolerance:
+                merged[-1][1] += units
+            else:
+                merged.append([index, units])
+        return merged
+
+    def _convert(self, params, palettes, picks):
+        """Scale and map a batch of picked frames in one kernel call"""
+        indices = [index for index, _ in picks]
+        return GIF_KERNEL.convert([self.frames[index] for index in indices], [palettes[index] for index in indices],
+                                  params["scale"], cv2.INTER_AREA)
+
+    def _encode(self, params, picks, fp, report=False):
+        """Encode picks into fp; returns the byte size of each frame"""
+        palettes = self._palettes_for(params["colors"])
+        writer = GifFrameWriter(fp, self.base_duration)
+        sizes = []
+        mapper = self.executor.map if self.executor is not None else map
+        # Convert in chunks so only a few scaled frames are alive at once
+        for start in range(0, len(picks), 32):
+            if self.job is not None:
+                self.job.check_cancelled()
+                if report:
+                    self.job.report("encoding", start, len(picks))
+            chunk = picks[start:start + 32]
+            batches = mapper(lambda batch: self._convert(params, palettes, batch),
+                             [chunk[i:i + 8] for i in range(0, len(chunk), 8)])
+            images = [img for batch in batches for img in batch]
+            for img, (_, units) in zip(images, chunk):
+                before = fp.tell()
+                writer.write(img, units * self.base_duration)
+                sizes.append(fp.tell() - before)
+        writer.close()
+        return sizes
+
+    def estimate(self, params):
+        """Estimated output size in bytes for params"""
+        picks = self.timeline(params["frame_step"], params["tolerance"])
+        if len(picks) <= self.windows * self.window_length:
+            # Short recordings are cheaper to just encode
+            return self._encoded_size(params, picks)
+
+        palettes = self._palettes_for(params["colors"])
+        full, delta = [], []
+        starts = np.linspace(0, len(picks) - self.window_length, self.windows).astype(int)
+        for start in starts:
+            sizes = self._encode(params, picks[start:start + self.window_length], io.BytesIO())
+            # The first frame of a window is always written in full
+            full.append(sizes[0])
+            delta.extend(sizes[1:])
+
+        # Frames whose palette differs from the one before are written in full too
+        full_frames = 1 + sum(1 for a, b in zip(picks, picks[1:]) if palettes[a[0]] is not palettes[b[0]])
+        return int(np.mean(full) * full_frames + np.mean(delta) * (len(picks) - full_frames))
+
+    def _encoded_size(self, params, picks):
+        fp = io.BytesIO()
+        self._encode(params, picks, fp)
+        return fp.tell()
+
+    def choose(self, ratio=None):
+        """Best-scoring params whose estimated size fits the budget"""
+        budget = self.target_bytes * self.margin
+        best = next(self._candidates())
+        if ratio is None:
+            size = self.estimate(best)
+            if size <= budget:
+                return best, size
+            ratio = budget / size
+
+        candidates = sorted(self._candidates(), key=self._score, reverse=True)
+        params, size = candidates[-1], None
+        for _ in range(5):
+            fitting = [p for p in candidates if self._size_factor(p) <= ratio]
+            if not fitting:
+                break
+            params = fitting[0]
+            size = self.estimate(params)
+            if size <= budget:
+                return params, size
+            # The model was optimistic; tighten it by how far off it was
+            ratio *= budget / size
+        return params, size
+
+    def export(self, filepath):
+        """Encode the recording to filepath under the budget; returns (params, size)"""
+        params, _ = self.choose()
+        size = self._export(params, filepath)
+        if size > self.target_bytes:
+            # Estimate was off; one corrected re-encode at a proportionally smaller target
+            ratio = self._size_factor(params) * (self.target_bytes * self.margin) / size
+            params, _ = self.choose(ratio)
+            size = self._export(params, filepath)
+        return params, size
+
+    def _export(self, params, filepath):
+        picks = self.timeline(params["frame_step"], params["tolerance"])
+        with open(filepath, "wb") as fp:
+            self._encode(params, picks, fp, report=True)
+            return fp.tell()
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth another try: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryingSession:
+    """A pooled requests.Session that retries transient failures.
+
+    Connections are kept alive and reused across requests, so repeated
+    uploads skip the TCP/TLS handshake. Every request gets a (connect, read)
+    timeout. Connection errors, timeouts and RETRY_STATUSES responses are
+    retried with exponential backoff and full jitter, honouring a server's
+    Retry-After. Request bodies with a ``reset()`` method (like
+    MultipartFileBody) are rewound before being sent again.
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=60.0, retries=3,
+                 backoff=0.5, max_backoff=8.0, pool_size=8):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        # Retries are handled in request() so bodies can be rewound
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt, response=None):
+        """Seconds to wait before retry number attempt + 1"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        body = kwargs.get("data")
+        for attempt in range(self.retries + 1):
+            if attempt and hasattr(body, "reset"):
+                body.reset()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Request failed ({e.__class__.__name__}), retrying...")
+                time.sleep(self._delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            print(f"Server returned {response.status_code}, retrying...")
+            delay = self._delay(attempt, response)
+            response.close()
+            time.sleep(delay)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide RetryingSession, created on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RetryingSession()
+        return _shared
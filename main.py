@@ -1,26 +1,25 @@
+import time
+# Reference point for the startup-time report
+_PROCESS_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox, BOTH
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from screen_recorder import ScreenRecorder
 import os
 from dotenv import load_dotenv, set_key
-from uploader import MediaUploader
 import threading
-import time
+import multiprocessing
 import webbrowser
-import pyperclip
-import requests
-import pyautogui
 import keyboard
-from datetime import datetime
 import sys
 from settings import Settings
 from settings_dialog import SettingsDialog
-import cv2
-import numpy as np
-import imageio
-from PIL import Image
+from upload_queue import UploadQueue, DONE
+from recordings_catalog import RecordingsCatalog
+from app_paths import recordings_dir
+# The recorder (cv2, numpy, ...) and the uploader (requests) are imported on
+# first use or by the background warm-up, so the window shows without them
 
 class APIKeyDialog(simpledialog.Dialog):
     def body(self, master):
@@ -120,9 +119,15 @@ class ScreenRecorderApp:
         # Center the window
         self.center_window()
         
-        # Initialize variables
-        self.recorder = ScreenRecorder()
-        self.uploader = MediaUploader()
+        # Initialize variables; recorder, uploader and upload queue are created
+        # lazily (see the properties below) or warmed up once the window shows
+        self._lazy_lock = threading.RLock()
+        self._recorder = None
+        self._uploader = None
+        self._upload_queue = None
+        self.startup_times = {}
+        # Recordings still being saved in the background
+        self.finalize_jobs = []
         self.recording = False
         self.paused = False
         self.frames = []
@@ -132,6 +137,15 @@ class ScreenRecorderApp:
         # Initialize settings
         self.settings = Settings()
         
+        # Recent recordings and uploads come from the catalog, not the folder
+        self.catalog = RecordingsCatalog()
+        self.catalog_version = -1
+        self.api_check_thread = None
+        self.calibration_thread = None
+        self.calibration_result = None
+        self.recording_paths = []
+        self.thumbnail_image = None
+        
         # Initialize timer
         self.timer_active = False
         self.timer_thread = None
@@ -145,6 +159,52 @@ class ScreenRecorderApp:
         # Check API key
         self.check_api_key()
         
+    @property
+    def recorder(self):
+        """The ScreenRecorder, created on first use"""
+        with self._lazy_lock:
+            if self._recorder is None:
+                from screen_recorder import ScreenRecorder
+                self._recorder = ScreenRecorder()
+                self._recorder.apply_performance_profile(self.settings.get_performance_profile())
+            return self._recorder
+            
+    @property
+    def uploader(self):
+        with self._lazy_lock:
+            if self._uploader is None:
+                from uploader import MediaUploader
+                self._uploader = MediaUploader()
+            return self._uploader
+            
+    @property
+    def upload_queue(self):
+        """Background uploads; jobs left over from the last run resume once it exists"""
+        with self._lazy_lock:
+            if self._upload_queue is None:
+                self._upload_queue = UploadQueue(self.uploader)
+            return self._upload_queue
+            
+    def _on_window_shown(self):
+        """Record time to first window, then warm up heavy modules off the UI thread"""
+        self.startup_times["window_shown_ms"] = round((time.perf_counter() - _PROCESS_STARTED) * 1000)
+        threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+        from autotune import needs_calibration
+        if needs_calibration(self.settings.get_performance_profile()):
+            # First start on this machine; let the warm-up finish first
+            self.root.after(3000, self.calibrate_performance)
+        
+    def _warm_up(self):
+        try:
+            self.recorder
+            self.upload_queue
+            import pyperclip
+        except Exception as e:
+            print(f"Warning: warm-up failed: {str(e)}")
+        self.startup_times["warm_up_ms"] = round((time.perf_counter() - _PROCESS_STARTED) * 1000)
+        print(f"Startup: window shown after {self.startup_times['window_shown_ms']} ms, "
+              f"warm-up finished after {self.startup_times['warm_up_ms']} ms")
+            
     def center_window(self):
         """Center the window on the screen"""
         self.root.update_idletasks()
@@ -173,6 +233,15 @@ class ScreenRecorderApp:
         )
         self.timer_label.pack(side=LEFT, padx=5)
         
+        # Live recorder health (capture FPS, queue, drops, worker load, memory)
+        self.metrics_label = ttk.Label(
+            timer_frame,
+            text="",
+            font=("Helvetica", 9),
+            bootstyle="secondary"
+        )
+        self.metrics_label.pack(side=LEFT, padx=5)
+        
         # Title
         title_label = ttk.Label(
             main_frame,
@@ -272,6 +341,17 @@ class ScreenRecorderApp:
         )
         self.pause_button.pack(pady=10)
         
+        # Cancel button for a recording that is still being saved
+        self.cancel_button = ttk.Button(
+            main_frame,
+            text="Cancel Saving",
+            command=self.cancel_finalize,
+            state=tk.DISABLED,
+            bootstyle="danger",
+            width=20
+        )
+        self.cancel_button.pack(pady=10)
+        
         # Status label
         self.status_label = ttk.Label(
             main_frame,
@@ -337,9 +417,15 @@ class ScreenRecorderApp:
         
         # Bind double-click event for recordings
         self.recordings_listbox.bind('<Double-Button-1>', self.open_recording)
+        self.recordings_listbox.bind('<<ListboxSelect>>', self.show_recording_details)
+        
+        # Thumbnail and details of the selected recording
+        self.details_label = ttk.Label(self.recordings_frame, font=("Helvetica", 9), compound=LEFT)
+        self.details_label.pack(fill=X, pady=(5, 0))
         
-        # Update recordings list
+        # Update recordings and uploads lists
         self.update_recordings_list()
+        self.update_uploads_list()
         
         # URL frame for showing share links
         self.url_frame = ttk.Frame(main_frame)
@@ -382,6 +468,7 @@ class ScreenRecorderApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Open Recordings Folder", command=self.open_recordings_folder)
+        file_menu.add_command(label="Calibrate Performance", command=self.calibrate_performance)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
@@ -464,14 +551,28 @@ Created by Berk Karaduman
         api_key = os.getenv('IMGBB_API_KEY')
         if not api_key:
             self.api_status_label.config(text="⬤ API Key Missing", foreground="red")
-            return False
+            return
             
-        if self.test_api_key(api_key):
+        # The check goes over the network (with retries); keep it off the UI thread
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(valid=self.test_api_key(api_key)),
+                                  name="api-key-check", daemon=True)
+        self.api_check_thread = thread
+        thread.start()
+        self.api_status_label.config(text="⬤ Checking API Key...", foreground="gray")
+        self.root.after(200, self.poll_api_status, thread, result)
+        
+    def poll_api_status(self, thread, result):
+        """Show the outcome of a key check started by update_api_status"""
+        if thread is not self.api_check_thread:
+            return  # Superseded by a check of a newer key
+        if thread.is_alive():
+            self.root.after(200, self.poll_api_status, thread, result)
+            return
+        if result.get("valid"):
             self.api_status_label.config(text="⬤ API Key Active", foreground="green")
-            return True
         else:
             self.api_status_label.config(text="⬤ API Key Invalid", foreground="red")
-            return False
         
     def test_api_key(self, api_key):
         """Test if the API key is valid"""
@@ -481,7 +582,8 @@ Created by Berk Karaduman
                 'key': api_key,
                 'image': 'R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw=='  # 1x1 transparent GIF
             }
-            response = requests.post('https://api.imgbb.com/1/upload', data=test_payload)
+            from http_client import get_session
+            response = get_session().post('https://api.imgbb.com/1/upload', data=test_payload)
             return response.status_code == 200 and 'data' in response.json()
         except:
             return False
@@ -494,6 +596,7 @@ Created by Berk Karaduman
             minutes = (elapsed % 3600) // 60
             seconds = elapsed % 60
             self.timer_label.config(text=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+            self.update_metrics_label()
             
             # Check if we should stop recording based on timer settings
             timer_settings = self.settings.get_timer_settings()
@@ -503,6 +606,19 @@ Created by Berk Karaduman
                     
         self.root.after(1000, self.update_timer)  # Update every second
         
+    def update_metrics_label(self):
+        """Show the recorder's live metrics next to the timer"""
+        metrics = self.recorder.get_metrics()
+        if not metrics or not metrics["capture"]:
+            return
+        memory_mb = metrics["buffered_frame_bytes"] / 1024 / 1024
+        self.metrics_label.config(
+            text=f"{metrics['capture']['achieved_fps']:.0f} fps | "
+                 f"queue {metrics['queue_depth']}/{metrics['queue_capacity']} | "
+                 f"dropped {metrics['capture']['dropped']} | "
+                 f"workers {metrics['worker_utilization']:.0%} | {memory_mb:.0f} MB"
+        )
+        
     def start_timer(self):
         """Start the timer"""
         self.timer_active = True
@@ -513,6 +629,7 @@ Created by Berk Karaduman
         """Stop the timer"""
         self.timer_active = False
         self.timer_label.config(text="00:00:00")
+        self.metrics_label.config(text="")
         
     def toggle_recording(self):
         """Toggle recording state"""
@@ -538,7 +655,11 @@ Created by Berk Karaduman
             self.recorder.start_recording(
                 format_type=self.format_var.get(),
                 fps=int(self.fps_var.get()),
-                quality=self.quality_var.get()
+                quality=self.quality_var.get(),
+                # Video is encoded while recording so stopping only flushes the file
+                streaming=self.format_var.get() == "video",
+                # Keep GIFs small enough to upload
+                target_size=self.uploader.MAX_FILE_SIZE
             )
             
             self.recording = True
@@ -558,40 +679,103 @@ Created by Berk Karaduman
         self.stop_timer()  # Stop timer when recording ends
         
         try:
-            # Stop video recording
-            file_path = self.recorder.stop_recording()
+            # Saving runs in the background; a new recording can start right away
+            job = self.recorder.stop_recording_async()
+            if job is None:
+                self.status_label.config(text="Error: No recording found")
+                return
+            self.finalize_jobs.append(job)
+            self.cancel_button.config(state=tk.NORMAL)
+            if len(self.finalize_jobs) == 1:
+                self.root.after(100, self.poll_finalize)
+        except Exception as e:
+            self.status_label.config(text=f"Error: {str(e)}")
+            
+    def poll_finalize(self):
+        """Show progress of recordings being saved and handle the finished ones"""
+        stages = {
+            "processing": "Processing frames",
+            "encoding": "Encoding frames",
+            "fitting": "Fitting GIF to the upload size limit",
+        }
+        for job in list(self.finalize_jobs):
+            updates = job.poll()
+            if updates and not self.recording and updates[-1][0] in stages:
+                stage, done, total = updates[-1]
+                counts = f" {done}/{total}" if total else ""
+                self.status_label.config(text=f"Saving recording... {stages[stage]}{counts}")
+            if not job.finished:
+                continue
+                
+            self.finalize_jobs.remove(job)
+            file_path = job.result
             if file_path:
                 # Show file path and upload
                 self.show_file_path(file_path)
                 
                 # Only attempt upload for GIF files
-                if self.format_var.get() == "gif":
-                    self.status_label.config(text="Uploading recording...")
-                    share_url = self.uploader.get_share_url(file_path)
-                    
-                    if share_url and not share_url.startswith("Error"):
-                        self.show_url(share_url)
-                        self.status_label.config(text="Recording saved and uploaded successfully!")
-                    else:
-                        error_msg = share_url if share_url else "Unknown upload error"
-                        self.status_label.config(text=f"Upload failed: {error_msg}")
+                if file_path.endswith(".gif"):
+                    self.upload_queue.submit(file_path)
+                    self.status_label.config(text="Recording saved, uploading in the background...")
                 else:
                     self.status_label.config(text="Recording saved successfully! (Video files are not uploaded)")
+            elif job.cancelled:
+                self.status_label.config(text="Saving cancelled")
             else:
-                self.status_label.config(text="Error: No recording found")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
+                self.status_label.config(text=f"Error: {job.error or 'No recording found'}")
+                
+        if self.finalize_jobs:
+            self.root.after(100, self.poll_finalize)
+        else:
+            self.cancel_button.config(state=tk.DISABLED)
             
+    def cancel_finalize(self):
+        """Cancel saving the most recently stopped recording"""
+        if self.finalize_jobs:
+            self.finalize_jobs[-1].cancel()
+            self.status_label.config(text="Cancelling...")
+            
+
+    def poll_uploads(self):
+        """Show finished background uploads and progress of running ones"""
+        if self._upload_queue is None:
+            # Not created until the warm-up (or the first upload)
+            self.root.after(500, self.poll_uploads)
+            return
+        for job in self.upload_queue.poll():
+            if job["status"] == DONE:
+                self.catalog.set_upload(job["file_path"], job["url"])
+                self.show_url(job["url"])
+                self.status_label.config(text="Recording uploaded! URL copied to clipboard.")
+            else:
+                self.status_label.config(text=f"Upload failed: {job['error']}")
+                
+        active = self.upload_queue.active()
+        if active and not self.recording and not self.finalize_jobs:
+            uploading = [job for job in active if job["status"] == "uploading"]
+            progress = f" {uploading[0]['progress']}%" if uploading else ""
+            self.status_label.config(text=f"Uploading {len(active)} recording(s)...{progress}")
+            
+        self.root.after(500, self.poll_uploads)
+        
+
     def show_file_path(self, file_path):
-        """Show file path as clickable link"""
+        """Add a saved recording to the catalog and the recent recordings list"""
         self.current_file_path = file_path
-        self.recordings_listbox.insert(tk.END, file_path)
+        self.catalog.add(file_path)
+        self.update_recordings_list()
+        
+    def selected_recording(self):
+        """Catalog path of the selected recording, or None"""
+        selected_index = self.recordings_listbox.curselection()
+        if selected_index and selected_index[0] < len(self.recording_paths):
+            return self.recording_paths[selected_index[0]]
+        return None
         
     def open_recording(self, event=None):
         """Open the selected recording's location"""
-        selected_index = self.recordings_listbox.curselection()
-        if selected_index:
-            file_path = self.recordings_listbox.get(selected_index)
+        file_path = self.selected_recording()
+        if file_path:
             if os.path.exists(file_path):
                 # Open file location in explorer and select the file
                 os.system(f'explorer /select,"{file_path}"')
@@ -628,10 +812,8 @@ Created by Berk Karaduman
         # Show copy button
         self.copy_button.pack(side="right", padx=5)
         
-        # Add URL to recent uploads list with clickable style
-        self.uploads_listbox.insert(0, url)  # Add at the top of the list
-        if self.uploads_listbox.size() > 10:  # Keep only last 10 uploads
-            self.uploads_listbox.delete(10, tk.END)
+        # Recent uploads are reloaded from the catalog
+        self.update_uploads_list()
         
         # Auto copy URL to clipboard
         self.copy_url()
@@ -640,6 +822,7 @@ Created by Berk Karaduman
     def copy_url(self):
         """Copy URL to clipboard"""
         if hasattr(self, 'current_url'):
+            import pyperclip
             pyperclip.copy(self.current_url)
             self.status_label.config(text="URL copied to clipboard!")
             
@@ -662,18 +845,59 @@ Created by Berk Karaduman
             self.uploads_frame.pack(fill=BOTH, expand=YES, pady=(0, 10))
             
     def update_recordings_list(self):
-        """Update the list of recent recordings"""
-        # Clear current list
+        """Update the list of recent recordings from the catalog"""
         self.recordings_listbox.delete(0, tk.END)
-        
-        # Get desktop path
-        desktop = os.path.join(os.path.expanduser("~"), "Desktop")
-        
-        # Look for recordings in desktop
-        for file in os.listdir(desktop):
-            if file.endswith(('.mp4', '.gif')):
-                file_path = os.path.join(desktop, file)
-                self.recordings_listbox.insert(tk.END, file_path)
+        self.recording_paths = []
+        for recording in self.catalog.recent():
+            self.recording_paths.append(recording["path"])
+            self.recordings_listbox.insert(tk.END, self.describe_recording(recording))
+            
+    def update_uploads_list(self):
+        """Update the list of recent uploads from the catalog"""
+        self.uploads_listbox.delete(0, tk.END)
+        for recording in self.catalog.recent_uploads(10):
+            self.uploads_listbox.insert(tk.END, recording["upload_url"])
+            
+    def describe_recording(self, recording):
+        """One line for the recordings list: name, length, resolution and size"""
+        parts = [os.path.basename(recording["path"])]
+        if recording["duration"] is not None:
+            minutes, seconds = divmod(int(round(recording["duration"])), 60)
+            parts.append(f"{minutes}:{seconds:02d}")
+        if recording["width"]:
+            parts.append(f"{recording['width']}x{recording['height']}")
+        parts.append(f"{recording['size'] / (1024 * 1024):.1f} MB")
+        return "  ".join(parts)
+        
+    def show_recording_details(self, event=None):
+        """Show the thumbnail and details of the selected recording"""
+        file_path = self.selected_recording()
+        recording = self.catalog.get(file_path) if file_path else None
+        if recording is None:
+            return
+        self.thumbnail_image = None
+        if recording["thumbnail"] and os.path.exists(recording["thumbnail"]):
+            self.thumbnail_image = tk.PhotoImage(file=recording["thumbnail"])
+        details = [recording["format"].upper()]
+        if recording["frames"]:
+            details.append(f"{recording['frames']} frames")
+        if recording["upload_url"]:
+            details.append("uploaded")
+        self.details_label.config(image=self.thumbnail_image or "", text="  " + ", ".join(details))
+        
+    def poll_catalog(self):
+        """Sync the catalog with the recordings folder and reload the lists when it changed"""
+        # Cheap unless the folder changed: one stat and one query on the catalog thread
+        self.catalog.refresh(recordings_dir())
+        if self.catalog.version != self.catalog_version:
+            self.catalog_version = self.catalog.version
+            selected = self.selected_recording()
+            self.update_recordings_list()
+            self.update_uploads_list()
+            if selected in self.recording_paths:
+                self.recordings_listbox.selection_set(self.recording_paths.index(selected))
+                self.show_recording_details()
+        self.root.after(2000, self.poll_catalog)
                 
     def show_settings(self):
         """Show settings dialog"""
@@ -686,6 +910,46 @@ Created by Berk Karaduman
         self.settings.load_settings()
         self.setup_hotkeys()
         
+    def calibrate_performance(self):
+        """Measure this machine in the background and store a tuned profile"""
+        if self.calibration_thread is not None and self.calibration_thread.is_alive():
+            return
+        if self.recording:
+            # Measurements would compete with the recording; try again later
+            self.root.after(10000, self.calibrate_performance)
+            return
+        self.calibration_result = None
+        self.calibration_thread = threading.Thread(target=self._calibrate, name="calibrate", daemon=True)
+        self.calibration_thread.start()
+        self.status_label.config(text="Calibrating performance...")
+        self.root.after(500, self.poll_calibration)
+        
+    def _calibrate(self):
+        try:
+            from autotune import calibrate
+            self.calibration_result = calibrate()
+        except Exception as e:
+            print(f"Warning: calibration failed: {str(e)}")
+            
+    def poll_calibration(self):
+        """Store and apply the calibrated profile once it is ready"""
+        if self.calibration_thread.is_alive():
+            self.root.after(500, self.poll_calibration)
+            return
+        profile = self.calibration_result
+        if profile is None:
+            self.status_label.config(text="Calibration failed")
+            return
+        self.settings.update_performance_profile(profile)
+        self.settings.save_settings()
+        # Used from the next recording on
+        self.recorder.apply_performance_profile(profile)
+        if not self.recording:
+            self.status_label.config(
+                text=f"Calibrated: {profile['thread_workers']} workers, chunks of {profile['chunk_size']}, "
+                     f"{profile['buffer_memory_mb']} MB buffer"
+            )
+            
     def toggle_pause(self):
         """Toggle pause state"""
         if self.recording:
@@ -701,8 +965,17 @@ Created by Berk Karaduman
     def run(self):
         # Check API status when starting
         self.root.after(1000, self.update_api_status)  # Check after 1 second
+        self.root.after(500, self.poll_uploads)
+        self.root.after(500, self.poll_catalog)
+        self.root.after_idle(self._on_window_shown)
         self.root.mainloop()
+        # Unfinished uploads stay in the journal and resume on next start
+        if self._upload_queue is not None:
+            self._upload_queue.close()
+        self.catalog.close()
 
 if __name__ == "__main__":
+    # Required for the process-based frame pipeline in the frozen executable
+    multiprocessing.freeze_support()
     app = ScreenRecorderApp()
     app.run() 
\ No newline at end of file
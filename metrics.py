@@ -0,0 +1,131 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """Latency histogram with power-of-two millisecond buckets.
+
+    Recording is a bisect and a few additions, cheap enough to do per frame.
+    Percentiles are reported as the upper bound of the bucket they fall in.
+    """
+
+    BOUNDS_MS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BOUNDS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+            self.count += 1
+            self.total += ms
+            self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """Upper bucket bound (ms) below which p percent of samples fall"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100.0
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+                "p50_ms": self.percentile(50),
+                "p95_ms": self.percentile(95),
+                "p99_ms": self.percentile(99),
+                "max_ms": round(self.max, 3),
+                "buckets": {f"<={bound:g}ms": count for bound, count in zip(self.BOUNDS_MS, self.counts) if count},
+            }
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms plus worker busy time for one recording.
+
+    Stages are free-form names ("capture", "process", "encode", ...).
+    Time spent in worker tasks is also added to a busy total, which against
+    the wall clock and the number of workers gives worker utilization.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.histograms = {}
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, busy=False):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(seconds)
+        if busy:
+            with self._lock:
+                self.busy_seconds += seconds
+
+    @contextmanager
+    def timed(self, stage, busy=False):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started, busy)
+
+    def utilization(self):
+        """Share of the workers' wall-clock time spent busy (0-1)"""
+        elapsed = time.perf_counter() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (elapsed * self.workers))
+
+    def snapshot(self):
+        return {
+            "worker_utilization": round(self.utilization(), 3),
+            "latency": {stage: histogram.snapshot() for stage, histogram in list(self.histograms.items())},
+        }
+
+
+class MetricsLogger:
+    """Appends a metrics snapshot to a JSON-lines file every interval seconds"""
+
+    def __init__(self, path, get_metrics, interval=1.0):
+        self.path = path
+        self.get_metrics = get_metrics
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        line = json.dumps(dict(self.get_metrics(), time=time.time()))
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def stop(self):
+        """Stop logging and write a final snapshot"""
+        self._stop.set()
+        self._thread.join()
+        self.write()
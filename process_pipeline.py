@@ -0,0 +1,115 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_processing import BGR, QUALITY_SCALE, resize_for_quality, convert_gif_frame
+from gif_palette import GIF_KERNEL
+from tracing import NULL_TRACER
+
+# Each worker maps the capture ring buffer once, in _attach_frames
+_shm = None
+_frames = None
+
+
+def _attach_frames(shm_name, storage_shape, dtype):
+    """Worker initializer: map the shared ring buffer as a numpy array"""
+    global _shm, _frames
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _frames = np.ndarray(storage_shape, dtype=dtype, buffer=_shm.buf)
+
+
+def _process_slot(slot, quality, format_type, palette=None, frame_format=BGR):
+    """Worker task: process the frame in one slot straight from shared memory
+    
+    Returns (result, start ns, duration ns, worker pid) so the parent can
+    track worker load and trace the task.
+    """
+    started = time.perf_counter_ns()
+    if format_type == "gif" and palette is not None:
+        # Resize and palette mapping in one go, straight from the slot into
+        # the worker's reused scratch buffers
+        frame = GIF_KERNEL.convert([_frames[slot]], [palette], QUALITY_SCALE.get(quality, 1.0))[0]
+    else:
+        frame = resize_for_quality(_frames[slot], quality, frame_format)
+        if format_type == "gif":
+            # Quantizing is the GIL-bound part, so do it here rather than in the parent
+            frame = convert_gif_frame(frame, quality, palette)
+    # At high quality this is still a view of the slot; it is pickled back to
+    # the parent before the slot is released, so no copy is needed
+    return frame, started, time.perf_counter_ns() - started, os.getpid()
+
+
+class ProcessFramePipeline:
+    """Processes ring buffer slots in worker processes, returning results in capture order.
+
+    The ring buffer must be created with ``shared=True``. Slots are handed to
+    workers by index only, and released back to the capture thread as soon
+    as their result has come back.
+    """
+
+    def __init__(self, frame_buffer, quality, format_type, workers=None, metrics=None, tracer=NULL_TRACER,
+                 frame_format=BGR):
+        self.frame_buffer = frame_buffer
+        # Optional PipelineMetrics that receives each task's worker time
+        self.metrics = metrics
+        self.tracer = tracer
+        self.quality = quality
+        self.format_type = format_type
+        self.frame_format = frame_format
+        # Leave a core for the capture thread
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        # Slots in flight are unavailable to capture, so cap them at half the buffer
+        self.max_in_flight = max(1, frame_buffer.capacity // 2)
+        self.pending = deque()
+        # Capture index of the next submitted slot, recorded on its trace span
+        self.frames_submitted = 0
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_attach_frames,
+            initargs=(frame_buffer.shm.name, frame_buffer.storage_shape, frame_buffer.dtype.str)
+        )
+
+    def submit(self, slot, palette=None):
+        """Queue a filled slot and return whatever results are ready, in order
+
+        palette is an optional GifPalette to map GIF frames onto.
+        """
+        future = self.executor.submit(_process_slot, slot, self.quality, self.format_type, palette,
+                                      self.frame_format)
+        self.pending.append((slot, self.frames_submitted, future))
+        self.frames_submitted += 1
+        return self.collect(wait=len(self.pending) >= self.max_in_flight)
+
+    def collect(self, wait=False):
+        """Return finished results from the head of the queue, optionally waiting for the first"""
+        results = []
+        while self.pending and (wait or self.pending[0][2].done()):
+            slot, frame_index, future = self.pending.popleft()
+            wait = False
+            try:
+                result, started, duration, pid = future.result()
+                results.append(result)
+                if self.metrics is not None:
+                    self.metrics.record("process", duration / 1e9, busy=True)
+                # perf_counter is system-wide, so worker timestamps line up with ours
+                self.tracer.add_span("process_slot", started, duration, tid=pid,
+                                     thread_name=f"worker {pid}", slot=slot, frame=frame_index)
+            except Exception as e:
+                print(f"Error processing frame: {str(e)}")
+            finally:
+                self.frame_buffer.release(slot)
+        return results
+
+    def drain(self):
+        """Wait for every queued slot and return the remaining results in order"""
+        results = []
+        while self.pending:
+            results.extend(self.collect(wait=True))
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
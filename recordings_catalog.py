@@ -0,0 +1,268 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app_paths import app_data_path
+from upload_cache import UploadCache
+
+EXTENSIONS = (".mp4", ".gif")
+THUMBNAIL_SIZE = (160, 90)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    format TEXT,
+    size INTEGER,
+    mtime REAL,
+    duration REAL,
+    frames INTEGER,
+    width INTEGER,
+    height INTEGER,
+    content_hash TEXT,
+    thumbnail TEXT,
+    upload_url TEXT,
+    uploaded REAL,
+    indexed INTEGER NOT NULL DEFAULT 0,
+    missing INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS recordings_folder ON recordings (folder);
+CREATE INDEX IF NOT EXISTS recordings_mtime ON recordings (mtime);
+CREATE INDEX IF NOT EXISTS recordings_uploaded ON recordings (uploaded);
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime REAL
+);
+"""
+
+
+class RecordingsCatalog:
+    """SQLite index of saved recordings, their metadata, thumbnails and upload URLs.
+
+    Listing is a single indexed query, so the UI can show thousands of
+    recordings without touching the folder. The folder itself is synced
+    incrementally by refresh(): nothing happens while its mtime is unchanged,
+    and otherwise only new or modified files (by size and mtime) are
+    re-indexed. Indexing (probing duration, frame count and resolution,
+    hashing the content and writing a small PNG thumbnail) runs on one
+    background thread; thumbnails are named after the content hash, so each
+    is generated once.
+
+    Rows of deleted files are dropped, except uploaded ones, which are only
+    marked missing so they stay in the upload history. ``version`` goes up on
+    every change; the UI compares it to decide when to reload its lists.
+    """
+
+    def __init__(self, path=None, thumbnail_dir=None):
+        self.path = path or app_data_path("recordings.db")
+        self.thumbnail_dir = thumbnail_dir or app_data_path("thumbnails")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+        self.version = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+        self._todo = queue.Queue()
+        self._closed = threading.Event()
+        self._queued = set()
+        self._thread = threading.Thread(target=self._worker, name="catalog", daemon=True)
+        self._thread.start()
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(sql, params)
+            if cursor.rowcount:
+                self.version += 1
+            return cursor.rowcount
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    # Queries (cheap enough for the UI thread)
+
+    def get(self, file_path):
+        rows = self._query("SELECT * FROM recordings WHERE path = ?", (os.path.abspath(file_path),))
+        return rows[0] if rows else None
+
+    def recent(self, limit=100):
+        """Recordings still on disk, newest first"""
+        return self._query("SELECT * FROM recordings WHERE missing = 0 ORDER BY mtime DESC LIMIT ?", (limit,))
+
+    def recent_uploads(self, limit=10):
+        """Uploaded recordings, most recently uploaded first"""
+        return self._query("SELECT * FROM recordings WHERE upload_url IS NOT NULL "
+                           "ORDER BY uploaded DESC LIMIT ?", (limit,))
+
+    # Updates
+
+    def add(self, file_path):
+        """Record a freshly saved file now and index it in the background"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        self._upsert(path, stat)
+        self._queue_index(path)
+
+    def set_upload(self, file_path, url):
+        """Attach the share URL of an uploaded file"""
+        path = os.path.abspath(file_path)
+        if self.get(path) is None and os.path.exists(path):
+            self.add(path)
+        self._write("UPDATE recordings SET upload_url = ?, uploaded = ? WHERE path = ?", (url, time.time(), path))
+
+    def refresh(self, folder):
+        """Sync the catalog with a folder's contents in the background"""
+        self._todo.put(("scan", os.path.abspath(folder)))
+
+    def _upsert(self, path, stat):
+        """Insert or reset a row; metadata, hash and thumbnail are filled in by _index"""
+        self._write(
+            "INSERT INTO recordings (path, folder, format, size, mtime) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+            "duration = NULL, frames = NULL, width = NULL, height = NULL, content_hash = NULL, "
+            "thumbnail = NULL, indexed = 0, missing = 0",
+            (path, os.path.dirname(path), "gif" if path.lower().endswith(".gif") else "video",
+             stat.st_size, stat.st_mtime))
+
+    # Background work
+
+    def _queue_index(self, path):
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+        self._todo.put(("index", path))
+
+    def _worker(self):
+        while True:
+            task = self._todo.get()
+            if task is None or self._closed.is_set():
+                return
+            kind, path = task
+            try:
+                if kind == "scan":
+                    self._scan(path)
+                else:
+                    self._index(path)
+            except Exception as e:
+                print(f"Catalog: could not {kind} {path}: {str(e)}")
+            finally:
+                if kind == "index":
+                    with self._lock:
+                        self._queued.discard(path)
+
+    def _scan(self, folder):
+        try:
+            folder_mtime = os.stat(folder).st_mtime
+        except OSError:
+            return
+        rows = self._query("SELECT path, size, mtime, indexed, missing FROM recordings WHERE folder = ?", (folder,))
+        known = {row["path"]: row for row in rows}
+        stored = self._query("SELECT mtime FROM folders WHERE path = ?", (folder,))
+
+        if not stored or stored[0]["mtime"] != folder_mtime:
+            seen = set()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(EXTENSIONS) or not entry.is_file():
+                        continue
+                    path = os.path.join(folder, entry.name)
+                    seen.add(path)
+                    stat = entry.stat()
+                    row = known.get(path)
+                    if row is None or row["size"] != stat.st_size or row["mtime"] != stat.st_mtime or row["missing"]:
+                        self._upsert(path, stat)
+                        known[path] = {"indexed": 0}
+            for path, row in known.items():
+                if path not in seen and not row.get("missing"):
+                    self._forget(path)
+            self._write("INSERT OR REPLACE INTO folders (path, mtime) VALUES (?, ?)", (folder, folder_mtime))
+
+        # Includes files whose indexing was interrupted last run
+        for path, row in known.items():
+            if not row["indexed"] and os.path.exists(path):
+                self._queue_index(path)
+
+    def _forget(self, path):
+        """Drop a deleted file, keeping uploaded ones as missing"""
+        if not self._write("UPDATE recordings SET missing = 1 WHERE path = ? AND upload_url IS NOT NULL", (path,)):
+            self._write("DELETE FROM recordings WHERE path = ?", (path,))
+
+    def _index(self, path):
+        row = self.get(path)
+        if row is None or row["indexed"]:
+            return
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) != (row["size"], row["mtime"]):
+            # Changed since it was queued (e.g. still being written); start over
+            self._upsert(path, stat)
+
+        try:
+            info, first_frame = probe(path)
+        except Exception as e:
+            # Unreadable (e.g. a broken partial file); index what we can, don't retry every scan
+            print(f"Catalog: could not read {path}: {str(e)}")
+            info, first_frame = {}, None
+        content_hash = UploadCache.hash_file(path)
+        thumbnail = os.path.join(self.thumbnail_dir, f"{content_hash[:32]}.png")
+        if first_frame is not None and not os.path.exists(thumbnail):
+            first_frame.thumbnail(THUMBNAIL_SIZE)
+            first_frame.save(thumbnail)
+        self._write(
+            "UPDATE recordings SET duration = ?, frames = ?, width = ?, height = ?, content_hash = ?, "
+            "thumbnail = ?, indexed = 1 WHERE path = ? AND size = ? AND mtime = ?",
+            (info.get("duration"), info.get("frames"), info.get("width"), info.get("height"), content_hash,
+             thumbnail if os.path.exists(thumbnail) else None, path, stat.st_size, stat.st_mtime))
+
+    def close(self):
+        """Stop after the current task; queued indexing resumes from the next refresh"""
+        self._closed.set()
+        self._todo.put(None)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            with self._lock:
+                self._conn.close()
+
+
+def probe(path):
+    """(metadata dict, first frame as an RGB PIL image or None) for an MP4 or GIF"""
+    from PIL import Image
+
+    if path.lower().endswith(".gif"):
+        with Image.open(path) as image:
+            width, height = image.size
+            first_frame = image.convert("RGB")
+            frames = 0
+            duration_ms = 0
+            try:
+                while True:
+                    frames += 1
+                    duration_ms += image.info.get("duration", 0)
+                    image.seek(image.tell() + 1)
+            except EOFError:
+                pass
+        return {"duration": duration_ms / 1000.0, "frames": frames, "width": width, "height": height}, first_frame
+
+    import cv2
+    capture = cv2.VideoCapture(path)
+    try:
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        info = {
+            "duration": frames / fps if fps else None,
+            "frames": frames,
+            "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+        ok, frame = capture.read()
+    finally:
+        capture.release()
+    first_frame = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) if ok else None
+    return info, first_frame
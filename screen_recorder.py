@@ -1,39 +1,123 @@
-import cv2
-import numpy as np
-import pyautogui
 import time
-from PIL import ImageGrab, Image
 import os
 from datetime import datetime
-import tkinter as tk
-from tkinter import ttk
-import mss
 import queue
 import threading
-import imageio
+import copy
 from concurrent.futures import ThreadPoolExecutor
+from frame_sources import MSSFrameSource
+from frame_scheduler import FrameScheduler
+from frame_buffer import FrameRingBuffer, DROP_NEWEST
+from frame_writers import open_video_writer, GifFrameWriter
+from frame_processing import (process_frame, convert_gif_frame, convert_captured, frame_buffer_shape,
+                              frame_size, GIF_COLORS, BGR, YUV420)
+from gif_palette import GifQuantizer, GIF_KERNEL, build_palette
+from gif_sizing import GifSizeFitter
+from frame_dedup import FrameDeduplicator
+from frame_store import FrameStore
+from process_pipeline import ProcessFramePipeline
+from finalize_job import FinalizeJob, FinalizeCancelled
+from metrics import PipelineMetrics, MetricsLogger
+from tracing import Tracer, NULL_TRACER
+from app_paths import recordings_dir
 
 class ScreenRecorder:
     def __init__(self):
         self.recording = False
-        # Increase queue size for better performance
-        self.frame_queue = queue.Queue(maxsize=2000)  # Increased from 1000 to 2000
+        # Per-recording copy of the recorder that owns the capture/processing threads
+        self._session = None
+        self._last_session = None
+        # Captured frames wait in a preallocated ring buffer (created per recording
+        # once the region size is known); the budget bounds its memory
+        self.frame_buffer = None
+        self.buffer_memory_mb = 512
+        self.buffer_policy = DROP_NEWEST
+        # RAM for processed frames kept until the recording is saved; later
+        # frames spill to a compressed file in the output folder (see frame_store.py)
+        self.frame_memory_mb = 1024
+        # Worker processes for the "process" pipeline (None = one per spare core)
+        self.process_workers = None
+        # GIF palettes: "scene" (one per scene), "global" (one for the whole
+        # recording) or None to quantize every frame on its own
+        self.gif_palette_mode = "scene"
+        # Collapse repeated frames into longer ones; a tolerance above 0 also
+        # merges near-identical frames (mean thumbnail difference, 0-255)
+        self.dedup_frames = True
+        self.dedup_tolerance = 0.0
+        # MP4 encoder: "ffmpeg" (libx264 over a pipe), "opencv" or "auto" (ffmpeg
+        # when a binary is available); the x264 options only apply to ffmpeg
+        self.video_backend = "auto"
+        self.video_preset = "veryfast"
+        self.video_crf = 23
+        self.video_threads = 0
+        self.video_pix_fmt = "yuv420p"
+        # Layout video frames are kept in from capture to encoder: BGR, or YUV420
+        # (I420, half the memory and bandwidth, passed to ffmpeg as is). GIF
+        # recordings always use BGR, which palette mapping works on
+        self.capture_format = BGR
+        self.frame_format = BGR
         # Get user's Desktop folder
         self.base_dir = os.path.join(os.path.expanduser("~"), "Desktop")
-        self.output_dir = os.path.join(self.base_dir, "Screen Recordings")
+        self.output_dir = recordings_dir()
         self.selected_region = None
         
         # Create recordings directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
             
-        self.thread_pool = ThreadPoolExecutor(max_workers=8)  # Increased from 4 to 8
+        # Tunables; apply_performance_profile() replaces these defaults with
+        # values calibrated for this machine (see autotune.py)
+        self.thread_workers = 8
+        # Frames collected before processing, split into sub-chunks per pool task
+        self.chunk_size = 100
+        self.sub_chunk_size = 20
+        # Frames per encode step when saving (also the progress/cancel granularity)
+        self.gif_chunk_size = 100
+        self.video_chunk_size = 200
+        # Created on first use (see thread_pool), not when the app starts
+        self._thread_pool = None
+        # Append a metrics snapshot (see get_metrics) to this JSON-lines file every second
+        self.metrics_log_path = None
+        # Write a Chrome trace (chrome://tracing, Perfetto) of each recording
+        # here: a file path, or a directory for timestamped trace files
+        self.trace_path = None
+        # Replaced per recording in start_recording; these let the processing and
+        # saving stages also be driven directly (e.g. by benchmark.py)
+        self.metrics = PipelineMetrics(self.thread_workers)
+        self.tracer = NULL_TRACER
         
-        # Initialize mss instance for better performance
-        self.sct = mss.mss()
+        # Live capture source; the mss instance is created on first grab so the
+        # recorder can be constructed (and driven by other sources) headlessly
+        self.frame_source = MSSFrameSource()
+        
+    PROFILE_KEYS = ("thread_workers", "process_workers", "chunk_size", "sub_chunk_size",
+                    "gif_chunk_size", "video_chunk_size", "buffer_memory_mb")
+    
+    def apply_performance_profile(self, profile):
+        """Use tuned worker counts, chunk sizes and buffer budget (see autotune.py)
+        
+        Takes effect from the next recording; missing keys keep their defaults.
+        """
+        thread_workers = self.thread_workers
+        for key in self.PROFILE_KEYS:
+            if profile and profile.get(key):
+                setattr(self, key, profile[key])
+        if self.thread_workers != thread_workers:
+            # Recordings still finalizing keep using the old pool; its threads
+            # exit once they drop it and it is garbage collected
+            self._thread_pool = None
+            
+    @property
+    def thread_pool(self):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers)
+        return self._thread_pool
         
     def select_region(self):
         """Open a window to select screen region"""
+        # Imported here so headless use (cli.py, benchmarks) never loads Tk
+        import tkinter as tk
+        
         root = tk.Tk()
         root.attributes('-alpha', 0.3)  # Make window semi-transparent
         root.attributes('-fullscreen', True)  # Make window fullscreen
@@ -94,7 +178,8 @@ class ScreenRecorder:
         
         return root.selected_region
         
-    def start_recording(self, region=None, format_type="video", fps=30, quality="high"):
+    def start_recording(self, region=None, format_type="video", fps=30, quality="high", source=None,
+                        buffer_policy=None, streaming=False, pipeline="thread", target_size=None):
         """Start screen recording"""
         if self.recording:
             return
@@ -103,254 +188,608 @@ class ScreenRecorder:
         self.format_type = format_type
         self.fps = fps
         self.quality = quality
+        # A FrameSource (frame_sources.py); synthetic and replay sources bring their own region
+        self.source = source or self.frame_source
+        # Encode while recording, so stop_recording only has to flush the file
+        self.streaming = streaming
+        self.writer = None
+        self.writer_error = None
+        # "process" works in worker processes reading the buffer through shared memory
+        self.pipeline = pipeline
+        self.frame_format = self.capture_format if format_type == "video" else BGR
+        # GIF frames come back from worker processes already quantized
+        self.frames_converted = pipeline == "process" and format_type == "gif"
+        self.deduplicator = FrameDeduplicator(self.dedup_tolerance) if self.dedup_frames else None
+        # Bytes a GIF export must fit under, by choosing scale, colors and frame rate (gif_sizing.py)
+        self.target_size = None
+        if target_size and format_type == "gif":
+            if streaming or self.frames_converted:
+                # Fitting re-encodes from the captured frames, which these modes don't keep
+                print("Target size needs the buffered thread pipeline; ignoring it")
+            else:
+                self.target_size = target_size
+        self.gif_quantizer = None
+        if format_type == "gif" and self.gif_palette_mode:
+            # One palette index is left free for transparency in delta frames
+            self.gif_quantizer = GifQuantizer(GIF_COLORS.get(quality, 256) - 1, self.gif_palette_mode)
         
-        # If no region provided, let user select it
+        # If no region provided, use the source's own or let user select it
+        if not region:
+            region = self.source.default_region()
         if not region:
             region = self.select_region()
             if not region:
                 self.recording = False
                 raise Exception("No region selected")
                 
+        if self.frame_format == YUV420:
+            # 4:2:0 chroma covers 2x2 pixel blocks, so drop an odd row/column
+            region = dict(region, width=region["width"] // 2 * 2, height=region["height"] // 2 * 2)
         self.selected_region = region
+        if streaming:
+            self.output_path = self._new_output_path()
+        self.scheduler = FrameScheduler(fps)
+        self.frame_buffer = FrameRingBuffer(
+            frame_buffer_shape(region["width"], region["height"], self.frame_format),
+            memory_budget_mb=self.buffer_memory_mb,
+            # drop_oldest, drop_newest, block or degrade when full (frame_buffer.py)
+            policy=buffer_policy or self.buffer_policy,
+            shared=pipeline == "process"
+        )
+        
+        self.frames_processed = 0
+        self.buffered_bytes = 0
+        self.finalize_job = None
+        self.metrics = PipelineMetrics(self.thread_workers)
+        self.tracer = Tracer(enabled=bool(self.trace_path))
+        
+        # The recording runs on its own shallow copy of the recorder, so it can
+        # keep finalizing in the background after stop_recording_async() while
+        # the next recording starts on this object (sharing one thread pool)
+        self.thread_pool
+        session = copy.copy(self)
+        self._session = session
         
         # Start recording and processing threads
-        self.capture_thread = threading.Thread(target=self._capture_frames)
-        self.process_thread = threading.Thread(target=self._process_frames)
+        session.capture_thread = threading.Thread(target=session._capture_frames, name="capture")
+        if pipeline == "process":
+            session.process_thread = threading.Thread(target=session._process_frames_multiprocess, name="process")
+        else:
+            session.process_thread = threading.Thread(target=session._process_frames, name="process")
         
-        self.capture_thread.start()
-        self.process_thread.start()
+        session.capture_thread.start()
+        session.process_thread.start()
+        session.metrics_logger = None
+        if self.metrics_log_path:
+            session.metrics_logger = MetricsLogger(self.metrics_log_path, session._collect_metrics).start()
         
     def _capture_frames(self):
         """Capture frames in a separate thread"""
-        frame_time = 1 / self.fps
-        next_frame_time = time.time()
+        self.scheduler.start()
         
         while self.recording:
-            current_time = time.time()
-            
-            # Only capture if it's time for the next frame
-            if current_time >= next_frame_time:
-                try:
-                    # Capture frame using mss with optimized settings
-                    frame = np.array(self.sct.grab(self.selected_region))
-                    
-                    if frame is not None and frame.size > 0:
-                        # Convert BGRA to BGR using optimized method
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=frame)
+            # Sleep until the next absolute tick deadline
+            tick = self.scheduler.wait()
+            if not self.recording:
+                break
+                
+            # Under degrade backpressure only every other tick is captured
+            if self.frame_buffer.degraded and tick % 2:
+                self.scheduler.record_drop()
+                continue
+                
+            try:
+                # Capture frame from the active source (mss by default)
+                grab_started = time.perf_counter_ns()
+                frame = self.source.grab(self.selected_region)
+                captured_at = time.perf_counter_ns()
+                self.metrics.record("capture", (captured_at - grab_started) / 1e9)
+                
+                if frame is None and self.source.finished:
+                    # Replay source ran out of frames
+                    break
+                
+                if frame is not None and frame.size > 0:
+                    slot = self.frame_buffer.acquire(timeout=0.5)
+                    # Time waiting for a free slot shows backpressure from processing
+                    self.metrics.record("buffer_wait", (time.perf_counter_ns() - captured_at) / 1e9)
+                    if slot is None:
+                        self.scheduler.record_drop()
+                        continue
                         
-                        # Add to queue if not full
-                        try:
-                            if not self.frame_queue.full():
-                                self.frame_queue.put(frame)
-                            else:
-                                # If queue is full, skip frame instead of waiting
-                                pass
-                        except:
-                            print("Error adding frame to queue")
-                            
-                    # Calculate next frame time
-                    next_frame_time = current_time + frame_time
-                except Exception as e:
-                    print(f"Error capturing frame: {str(e)}")
-                    continue
-                    
-            # Small sleep to prevent high CPU usage
-            time.sleep(0.0005)  # Reduced sleep time
+                    # Convert BGRA to BGR (or YUV420) straight into the preallocated slot
+                    height, width = self.selected_region["height"], self.selected_region["width"]
+                    if self.frame_format == YUV420:
+                        # Sources that ignore the region still have their odd row/column
+                        frame = frame[:height, :width]
+                    if frame.shape[:2] != (height, width):
+                        self.frame_buffer.discard(slot)
+                        print(f"Error capturing frame: unexpected size {frame.shape[1]}x{frame.shape[0]}")
+                        continue
+                    convert_captured(frame, self.frame_buffer.slots[slot], self.frame_format)
+                    self.frame_buffer.commit(slot)
+                    self.scheduler.record_capture(captured_at)
+                    self.tracer.add_span("capture", grab_started, time.perf_counter_ns() - grab_started,
+                                         tick=tick, slot=slot)
+            except Exception as e:
+                print(f"Error capturing frame: {str(e)}")
+                continue
+                
+        self.scheduler.stop()
+        
+    def is_capturing(self):
+        """Whether frames are still being captured (a replay source can run out)"""
+        return self._session is not None and self._session.capture_thread.is_alive()
+        
+    def get_metrics(self):
+        """Live health of the current (or last) recording
+        
+        Capture stats, ring buffer depth, frames processed, memory held by
+        buffered frames, worker utilization and per-stage latency histograms
+        ("capture", "buffer_wait", "process", "encode", "save", ...). High
+        capture latency means capture-bound, busy workers CPU-bound, slow
+        encode/save disk- or encoder-bound.
+        """
+        session = self._session or self._last_session
+        if session is None:
+            return None
+        return session._collect_metrics()
+        
+    def _collect_metrics(self):
+        metrics = {
+            "recording": self.recording,
+            "capture": self.get_capture_stats(),
+            "queue_depth": len(self.frame_buffer),
+            "queue_capacity": self.frame_buffer.capacity,
+            "frames_processed": self.frames_processed,
+            "ring_buffer_bytes": self.frame_buffer.nbytes,
+            "buffered_frame_bytes": self.buffered_bytes,
+            "spilled_frame_bytes": self.processed_frames.spilled_bytes if self.processed_frames else 0,
+        }
+        metrics.update(self.metrics.snapshot())
+        return metrics
+        
+    def get_capture_stats(self):
+        """Return achieved FPS and late/skipped/dropped frame counts"""
+        if not hasattr(self, "scheduler"):
+            return None
+        stats = self.scheduler.stats()
+        # Frames overwritten in the ring buffer never reach processing either
+        stats["dropped"] += self.frame_buffer.evicted
+        stats["captured"] -= self.frame_buffer.evicted
+        return stats
             
-    def process_frame_chunk(self, chunk, quality):
-        """Process a chunk of frames in parallel"""
+    def process_frame_chunk(self, chunk, quality, first_frame=0):
+        """Process a chunk of frames in parallel; first_frame is the capture index of chunk[0], for tracing"""
         processed_frames = []
-        for frame in chunk:
-            if frame is not None and frame.size > 0:
-                try:
-                    if quality == "medium":
-                        frame = cv2.resize(frame, None, fx=0.75, fy=0.75)
-                    elif quality == "low":
-                        frame = cv2.resize(frame, None, fx=0.5, fy=0.5)
-                    processed_frames.append(frame)
-                except Exception as e:
-                    print(f"Error processing frame: {str(e)}")
+        with self.tracer.span("process_sub_chunk", frames=len(chunk), first_frame=first_frame):
+            for frame in chunk:
+                if frame is not None and frame.size > 0:
+                    try:
+                        with self.metrics.timed("process", busy=True):
+                            processed_frames.append(process_frame(frame, quality, self.frame_format))
+                    except Exception as e:
+                        print(f"Error processing frame: {str(e)}")
         return processed_frames
 
+    def convert_gif_frame(self, frame, palette=None):
+        """Convert a processed BGR frame to a palette image for GIF output"""
+        return convert_gif_frame(frame, self.quality, palette)
+        
+    def convert_gif_frames(self, frames, start=0, end=None):
+        """Convert frames[start:end] in parallel, mapping them to shared palettes when enabled
+        
+        With palettes, sub-chunks go through GIF_KERNEL as batches, which
+        reuses its scratch buffers on each pool thread. Each task reads its
+        own frames, so only the batches being converted are held at once.
+        """
+        end = len(frames) if end is None else end
+        with self.tracer.span("quantize_frames", frames=end - start):
+            if self.gif_quantizer is None:
+                return list(self.thread_pool.map(lambda i: self.convert_gif_frame(frames[i]), range(start, end)))
+            palettes = self.gif_quantizer.assign(frames, start, end)
+            step = self.sub_chunk_size
+            
+            def convert_batch(first):
+                last = min(first + step, end)
+                return GIF_KERNEL.convert([frames[i] for i in range(first, last)],
+                                          palettes[first - start:last - start])
+                
+            batches = self.thread_pool.map(convert_batch, range(start, end, step))
+            return [image for batch in batches for image in batch]
+        
+    def _emit_frames(self, frames, final=False):
+        """Keep processed frames for stop_recording, or encode them now when streaming
+        
+        Repeated frames are collapsed first; each kept frame carries how many
+        capture intervals it lasts. final=True flushes the last held frame.
+        """
+        if self.deduplicator is not None:
+            pairs = []
+            for frame in frames:
+                pairs.extend(self.deduplicator.push(frame))
+            if final:
+                pairs.extend(self.deduplicator.flush())
+        else:
+            pairs = [(frame, 1) for frame in frames]
+        self.frames_processed += len(frames)
+        if self.finalize_job is not None and self.finalize_job.cancelled:
+            # Saving was cancelled; just drain the buffer
+            return
+            
+        if not self.streaming:
+            for frame, repeats in pairs:
+                self.processed_frames.append(frame)
+                self.frame_repeats.append(repeats)
+            self.buffered_bytes = self.processed_frames.memory_bytes
+            return
+        if self.writer_error or not pairs:
+            return
+            
+        with self.tracer.span("stream_chunk", frames=len(pairs)):
+            try:
+                if self.format_type == "video":
+                    if self.writer is None:
+                        width, height = frame_size(pairs[0][0], self.frame_format)
+                        self.writer = self._open_video_writer(self.output_path, (width, height))
+                    for frame, repeats in pairs:
+                        with self.metrics.timed("encode"):
+                            self.writer.write(frame, repeats)
+                else:
+                    # Quantize the chunk in parallel, then append in capture order
+                    if self.frames_converted:
+                        images = [frame for frame, _ in pairs]
+                    else:
+                        with self.metrics.timed("quantize_chunk"):
+                            images = self.convert_gif_frames([frame for frame, _ in pairs])
+                    if self.writer is None:
+                        self.writer = GifFrameWriter(self.output_path, self._gif_duration())
+                    for img, (_, repeats) in zip(images, pairs):
+                        with self.metrics.timed("encode"):
+                            self.writer.write(img, repeats * self._gif_duration())
+            except Exception as e:
+                # Stop encoding but keep draining the buffer so capture is not stalled
+                self.writer_error = str(e)
+                print(f"Error writing frames: {self.writer_error}")
+        
     def _process_frames(self):
         """Process frames in a separate thread with parallel processing"""
-        self.processed_frames = []
+        self.processed_frames = FrameStore(self.output_dir, self.frame_memory_mb)
+        self.frame_repeats = []
         frame_count = 0
         chunk = []
-        chunk_size = 100  # Increased from 50 to 100
+        # A chunk holds its ring buffer slots until processed, so leave the
+        # capture side at least half of the buffer
+        chunk_size = max(1, min(self.chunk_size, self.frame_buffer.capacity // 2))
+        
+        # Capture index of the next slot to process, for trace spans
+        next_frame = 0
+        
+        def process_chunk(chunk):
+            nonlocal next_frame
+            first_frame, next_frame = next_frame, next_frame + len(chunk)
+            span = self.tracer.span("process_chunk", frames=len(chunk), first_frame=first_frame)
+            frames = [self.frame_buffer.slots[slot] for slot in chunk]
+            
+            # One pool task per sub-chunk
+            step = self.sub_chunk_size
+            sub_chunks = [frames[i:i + step] for i in range(0, len(frames), step)]
+            futures = []
+            
+            with span:
+                # Submit sub-chunks for parallel processing
+                for i, sub_chunk in enumerate(sub_chunks):
+                    future = self.thread_pool.submit(self.process_frame_chunk, sub_chunk, self.quality,
+                                                     first_frame + i * step)
+                    futures.append(future)
+                
+                # Collect results
+                processed = []
+                for future in futures:
+                    processed.extend(future.result())
+                
+            # Slots can be reused by the capture thread now
+            for slot in chunk:
+                self.frame_buffer.release(slot)
+            return processed
         
-        while self.recording or not self.frame_queue.empty():
+        # Keep draining until the capture thread has committed its last frame
+        while self.recording or self.capture_thread.is_alive() or not self.frame_buffer.empty():
             try:
-                # Get frame from queue with shorter timeout
-                frame = self.frame_queue.get(timeout=0.05)  # Reduced timeout
-                chunk.append(frame)
+                # Get frame slot from the ring buffer with shorter timeout
+                slot = self.frame_buffer.get(timeout=0.05)  # Reduced timeout
+                chunk.append(slot)
                 
                 # Process chunk when it reaches the desired size
                 if len(chunk) >= chunk_size:
-                    # Split chunk into larger sub-chunks for better parallel processing
-                    sub_chunks = [chunk[i:i + 20] for i in range(0, len(chunk), 20)]  # Increased from 10 to 20
-                    futures = []
-                    
-                    # Submit sub-chunks for parallel processing
-                    for sub_chunk in sub_chunks:
-                        future = self.thread_pool.submit(self.process_frame_chunk, sub_chunk, self.quality)
-                        futures.append(future)
-                    
-                    # Collect results
-                    for future in futures:
-                        self.processed_frames.extend(future.result())
-                        frame_count += len(future.result())
-                    
+                    processed = process_chunk(chunk)
+                    self._emit_frames(processed)
+                    frame_count += len(processed)
                     chunk = []
                     
             except queue.Empty:
-                if self.recording:
-                    continue
-                else:
-                    # Process remaining frames
-                    if chunk:
-                        processed = self.process_frame_chunk(chunk, self.quality)
-                        self.processed_frames.extend(processed)
-                        frame_count += len(processed)
-                    break
-                    
+                continue
+                
+        # Process remaining frames
+        processed = process_chunk(chunk) if chunk else []
+        self._emit_frames(processed, final=True)
+        frame_count += len(processed)
+            
         print(f"Processed {frame_count} frames")
+        self._report_duplicates()
 
+    def _report_duplicates(self):
+        if self.deduplicator is not None and self.deduplicator.duplicates:
+            print(f"Collapsed {self.deduplicator.duplicates} repeated frames")
+            
+    def _process_frames_multiprocess(self):
+        """Process frames in worker processes that read the shared frame buffer"""
+        self.processed_frames = FrameStore(self.output_dir, self.frame_memory_mb)
+        self.frame_repeats = []
+        frame_count = 0
+        pipeline = ProcessFramePipeline(self.frame_buffer, self.quality, self.format_type,
+                                        self.process_workers, self.metrics, self.tracer, self.frame_format)
+        self.metrics.workers = pipeline.workers
+        # GIF slots are held back in small windows so palettes are sampled from
+        # several frames; held slots count against the capture buffer too
+        window = []
+        window_size = max(1, min(self.sub_chunk_size, pipeline.max_in_flight // 2))
+        
+        try:
+            # Keep draining until the capture thread has committed its last frame
+            while self.recording or self.capture_thread.is_alive() or not self.frame_buffer.empty():
+                try:
+                    slot = self.frame_buffer.get(timeout=0.05)
+                    if self.gif_quantizer is None:
+                        results = pipeline.submit(slot)
+                    else:
+                        window.append(slot)
+                        results = pipeline.collect()
+                        if len(window) >= window_size:
+                            results += self._submit_window(pipeline, window)
+                except queue.Empty:
+                    results = pipeline.collect()
+                self._emit_frames(results)
+                frame_count += len(results)
+                
+            results = self._submit_window(pipeline, window) + pipeline.drain()
+            self._emit_frames(results, final=True)
+            frame_count += len(results)
+        finally:
+            pipeline.shutdown()
+            
+        print(f"Processed {frame_count} frames in {pipeline.workers} worker processes")
+        self._report_duplicates()
+        
+    def _submit_window(self, pipeline, window):
+        """Submit held GIF slots with palettes chosen across all of them; returns ready results"""
+        if not window:
+            return []
+        # Chosen here so every worker maps onto the same palettes
+        palettes = self.gif_quantizer.assign([self.frame_buffer.slots[slot] for slot in window])
+        results = []
+        for slot, palette in zip(window, palettes):
+            results.extend(pipeline.submit(slot, palette))
+        window.clear()
+        return results
+        
     def stop_recording(self):
-        """Stop recording and save the file"""
+        """Stop recording and save the file; blocks until it is saved"""
+        job = self.stop_recording_async()
+        return job.wait() if job else None
+        
+    def stop_recording_async(self):
+        """Stop recording and save the file on a background thread
+        
+        Returns a FinalizeJob (see finalize_job.py) that reports progress and
+        can be cancelled; its result is the saved file path. A new recording
+        can be started as soon as this returns.
+        """
         if not self.recording:
             return None
             
         print("Stopping recording...")
         self.recording = False
+        session, self._session = self._session, None
+        self._last_session = session
+        session.recording = False
+        
+        # Capture stops within a frame; wait for it here so the next recording
+        # never shares the live source with this one
+        session.frame_buffer.close()
+        session.capture_thread.join()
+        if session.source is self.frame_source:
+            # Recreated lazily on the next capture thread
+            self.frame_source.close()
+            
+        session.finalize_job = FinalizeJob(session._finalize)
+        return session.finalize_job.start()
+        
+    def _finalize(self, job):
+        """Finish a stopped recording on its session: drain, encode and save"""
+        try:
+            return self._finalize_stages(job)
+        finally:
+            # Frees the frames and removes any spill file, also when cancelled
+            self.processed_frames.close()
+            self.buffered_bytes = 0
+            if self.metrics_logger is not None:
+                self.metrics_logger.stop()
+            if self.tracer.enabled:
+                self._save_trace()
+                
+    def _save_trace(self):
+        path = self.trace_path
+        if os.path.isdir(path):
+            path = os.path.join(path, f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            print(f"Trace written to: {self.tracer.save(path)}")
+        except OSError as e:
+            print(f"Error writing trace: {str(e)}")
+            
+    def _finalize_stages(self, job):
+        # Wait for processing to drain the buffer
+        with self.tracer.span("drain"):
+            while self.process_thread.is_alive():
+                job.report("processing", self.frames_processed, self.get_capture_stats()["captured"])
+                self.process_thread.join(0.2)
+        self.frame_buffer.dispose()
         
-        # Wait for threads to finish
-        self.capture_thread.join()
-        self.process_thread.join()
+        stats = self.get_capture_stats()
+        print(f"Captured {stats['captured']} frames at {stats['achieved_fps']:.1f}/{stats['target_fps']} FPS "
+              f"(late: {stats['late']}, skipped: {stats['skipped']}, dropped: {stats['dropped']})")
         
+        if self.streaming:
+            return self._finish_streaming(job)
+        job.check_cancelled()
+            
         if not self.processed_frames:
             print("No frames were processed!")
             return None
             
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = self._new_output_path()
         
-        if self.format_type == "video":
-            filename = f"recording_{timestamp}.mp4"
-            filepath = os.path.join(self.output_dir, filename)
+        try:
+            save_started = time.perf_counter()
+            with self.tracer.span("save", format=self.format_type, frames=len(self.processed_frames)):
+                if self.format_type == "video":
+                    self._save_video(filepath, job)
+                elif self.target_size:
+                    self._save_sized_gif(filepath, job)
+                else:
+                    self._save_gif(filepath, job)
+        except FinalizeCancelled:
+            self._remove_partial(filepath)
+            raise
+        except Exception as e:
+            print(f"Error saving {'video' if self.format_type == 'video' else 'GIF'}: {str(e)}")
+            return None
+        finally:
+            self.frame_repeats = []
+            self.metrics.record("save", time.perf_counter() - save_started)
             
-            try:
-                # Get frame dimensions
-                height, width = self.processed_frames[0].shape[:2]
-                
-                # Create video writer with FFmpeg codec
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(filepath, fourcc, self.fps, (width, height))
-                
-                if not out.isOpened():
-                    print("Failed to create video writer!")
-                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                    out = cv2.VideoWriter(filepath, fourcc, self.fps, (width, height))
-                
-                # Write frames in larger chunks for better performance
-                chunk_size = 200  # Increased from 100 to 200
-                frames_written = 0
-                for i in range(0, len(self.processed_frames), chunk_size):
-                    chunk = self.processed_frames[i:i + chunk_size]
-                    for frame in chunk:
-                        out.write(frame)
-                        frames_written += 1
-                        
-                print(f"Wrote {frames_written} frames to video")
-                out.release()
-                
-            except Exception as e:
-                print(f"Error saving video: {str(e)}")
-                return None
+        job.report("saved", os.path.getsize(filepath), os.path.getsize(filepath))
+        print(f"Recording saved to: {filepath}")
+        return filepath
+        
+    def _save_video(self, filepath, job):
+        # Get frame dimensions
+        width, height = frame_size(self.processed_frames[0], self.frame_format)
+        out = self._open_video_writer(filepath, (width, height))
+        try:
+            chunk_size = self.video_chunk_size
+            for i in range(0, len(self.processed_frames), chunk_size):
+                job.check_cancelled()
+                job.report("encoding", i, len(self.processed_frames))
+                with self.tracer.span("encode_chunk", first_frame=i):
+                    # One frame at a time; spilled frames are decompressed as they are written
+                    for index in range(i, min(i + chunk_size, len(self.processed_frames))):
+                        out.write(self.processed_frames[index], self.frame_repeats[index])
+        finally:
+            out.close()
+        print(f"Wrote {out.frames_written} frames to video")
+        
+    def _save_gif(self, filepath, job):
+        # Save as GIF, writing only the changed region of each frame
+        out = GifFrameWriter(filepath, self._gif_duration())
+        total = len(self.processed_frames)
+        quantizer = self.gif_quantizer
+        if not self.frames_converted and quantizer is not None and quantizer.mode != "scene":
+            # The global palette covers the whole recording, not just the first chunk
+            quantizer.palette = build_palette(self.processed_frames, quantizer.colors, start=0, end=total)
+        try:
+            # Convert frames in parallel chunks; map keeps them in capture order
+            step = self.gif_chunk_size
+            for i in range(0, total, step):
+                job.check_cancelled()
+                job.report("encoding", i, total)
+                end = min(i + step, total)
+                if self.frames_converted:
+                    pil_frames = (self.processed_frames[index] for index in range(i, end))
+                else:
+                    pil_frames = self.convert_gif_frames(self.processed_frames, i, end)
+                with self.tracer.span("encode_chunk", first_frame=i):
+                    for img, repeats in zip(pil_frames, self.frame_repeats[i:i + step]):
+                        out.write(img, repeats * self._gif_duration())
+        finally:
+            out.close()
+        print(f"Converted {total} frames to optimized GIF format")
+        
+    @staticmethod
+    def _remove_partial(filepath):
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
             
-        else:  # GIF
-            filename = f"recording_{timestamp}.gif"
-            filepath = os.path.join(self.output_dir, filename)
+    def _save_sized_gif(self, filepath, job):
+        """Save the GIF with the best settings that fit under target_size"""
+        job.report("fitting")
+        fitter = GifSizeFitter(self.processed_frames, self.frame_repeats, self.quality,
+                               self._gif_duration(), self.target_size,
+                               self.gif_palette_mode or "scene", self.thread_pool, job=job)
+        params, size = fitter.export(filepath)
+        print(f"Fitted GIF to {size / 1e6:.1f}/{self.target_size / 1e6:.1f} MB "
+              f"(scale {params['scale']}, {params['colors']} colors, "
+              f"every {params['frame_step']} frame(s), tolerance {params['tolerance']})")
+        if size > self.target_size:
+            print("Warning: GIF is still over the target size")
             
+    def _finish_streaming(self, job):
+        """Flush the streaming writer; frames were already encoded while recording"""
+        writer, self.writer = self.writer, None
+        if job.cancelled and writer is not None:
+            # Drop the partly written file
             try:
-                # Pre-allocate list for better performance
-                total_frames = len(self.processed_frames)
-                pil_frames = [None] * total_frames
-                
-                # Use thread pool for parallel conversion with optimized settings
-                def convert_frame_optimized(args):
-                    idx, frame = args
-                    # Resize before conversion to reduce memory usage
-                    if self.quality == "medium":
-                        frame = cv2.resize(frame, None, fx=0.75, fy=0.75)
-                    elif self.quality == "low":
-                        frame = cv2.resize(frame, None, fx=0.5, fy=0.5)
-                    
-                    # Convert to RGB and reduce colors for smaller file size
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    img = Image.fromarray(frame_rgb)
-                    
-                    # Reduce colors based on quality setting
-                    if self.quality == "low":
-                        img = img.quantize(colors=64)  # Reduce to 64 colors
-                    elif self.quality == "medium":
-                        img = img.quantize(colors=128)  # Reduce to 128 colors
-                    else:  # high quality
-                        img = img.quantize(colors=256)  # Use full 256 colors
-                    
-                    return idx, img
-                
-                # Convert frames in parallel with index tracking
-                frame_data = list(enumerate(self.processed_frames))
-                results = list(self.thread_pool.map(convert_frame_optimized, frame_data))
-                
-                # Place frames in correct order
-                for idx, img in results:
-                    pil_frames[idx] = img
-                
-                print(f"Converted {len(pil_frames)} frames to optimized GIF format")
-                
-                # Optimize GIF settings based on quality
-                if self.quality == "high":
-                    optimize = True
-                    quality = 90
-                elif self.quality == "medium":
-                    optimize = True
-                    quality = 70
-                else:  # low
-                    optimize = True
-                    quality = 50
-                
-                # Calculate optimal duration based on FPS
-                duration = max(20, int(1000/self.fps))  # Minimum 20ms (50 FPS max)
-                
-                # Save as GIF with optimizations
-                pil_frames[0].save(
-                    filepath,
-                    save_all=True,
-                    append_images=pil_frames[1:],
-                    duration=duration,
-                    loop=0,
-                    optimize=optimize,
-                    quality=quality
-                )
-                
-            except Exception as e:
-                print(f"Error saving GIF: {str(e)}")
-                return None
+                writer.close()
+            except Exception:
+                pass
+            self._remove_partial(writer.filepath)
+        job.check_cancelled()
+        if writer is None:
+            print("No frames were processed!")
+            return None
+            
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"Error finalizing recording: {str(e)}")
+            return None
             
-        # Clear memory
-        self.processed_frames = []
+        if self.writer_error:
+            print(f"Error saving recording: {self.writer_error}")
+            return None
+            
+        print(f"Wrote {writer.frames_written} frames while recording")
+        job.report("saved", os.path.getsize(writer.filepath), os.path.getsize(writer.filepath))
+        print(f"Recording saved to: {writer.filepath}")
+        return writer.filepath
         
-        print(f"Recording saved to: {filepath}")
-        return filepath
+    def _new_output_path(self):
+        """Timestamped path in the recordings folder for the current format"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        extension = "mp4" if self.format_type == "video" else "gif"
+        return os.path.join(self.output_dir, f"recording_{timestamp}.{extension}")
+        
+    def _open_video_writer(self, filepath, size):
+        return open_video_writer(filepath, self.fps, size, self.video_backend, preset=self.video_preset,
+                                 crf=self.video_crf, threads=self.video_threads, pix_fmt=self.video_pix_fmt,
+                                 frame_format=self.frame_format)
+        
+    def _gif_duration(self):
+        """Frame duration in ms for the current FPS"""
+        return max(20, int(1000/self.fps))  # Minimum 20ms (50 FPS max)
 
     def pause(self):
         """Pause recording"""
         self.recording = False
+        if self._session is not None:
+            self._session.recording = False
         
     def resume(self):
         """Resume recording"""
         self.recording = True
-        self.capture_thread = threading.Thread(target=self._capture_frames)
-        self.capture_thread.start() 
\ No newline at end of file
+        session = self._session
+        session.recording = True
+        session.capture_thread = threading.Thread(target=session._capture_frames, name="capture")
+        session.capture_thread.start() 
\ No newline at end of file
@@ -18,7 +18,9 @@ class Settings:
                 "enabled": False,
                 "start_delay": 0,
                 "stop_after": 0
-            }
+            },
+            # Filled in by autotune.py for this machine
+            "performance": {}
         }
         self.settings = self.load_settings()
         
@@ -64,4 +66,12 @@ class Settings:
         if start_delay is not None:
             self.settings["timer"]["start_delay"] = start_delay
         if stop_after is not None:
-            self.settings["timer"]["stop_after"] = stop_after 
\ No newline at end of file
+            self.settings["timer"]["stop_after"] = stop_after
+            
+    def get_performance_profile(self):
+        """Get the calibrated performance profile (empty if not calibrated yet)"""
+        return self.settings.get("performance", {})
+        
+    def update_performance_profile(self, profile):
+        """Replace the performance profile"""
+        self.settings["performance"] = profile
\ No newline at end of file
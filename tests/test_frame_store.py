@@ -0,0 +1,30 @@
+import numpy as np
+from PIL import Image
+
+from frame_store import FrameStore
+
+
+def test_spilled_frames_read_back_after_writer_is_idle(tmp_path):
+    rng = np.random.default_rng(0)
+    # Small, mostly flat frames compress to a few bytes, so records are
+    # published while their data still sits in the file's write buffer
+    frames = [np.full((24, 32, 3), i, dtype=np.uint8) for i in range(40)]
+    frames[7][3:9, 4:12] = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(np.arange(24 * 32, dtype=np.uint8).reshape(24, 32) % 7)
+    image.putpalette(list(range(7 * 3)))
+
+    store = FrameStore(str(tmp_path), memory_budget_mb=0)
+    try:
+        for frame in frames:
+            store.append(frame)
+        store.append(image)
+        store._queue.join()  # writer idle; nothing has been read yet
+
+        assert len(store) == len(frames) + 1
+        for i, frame in enumerate(frames):
+            assert np.array_equal(store[i], frame)
+        assert np.array_equal(np.asarray(store[-1]), np.asarray(image))
+        assert store[-1].getpalette()[:21] == list(range(21))
+    finally:
+        store.close()
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app_paths import app_data_path
+
+
+class UploadCache:
+    """Remembers what was already uploaded, keyed by a hash of the file content.
+
+    Uploading the same bytes again (a re-run after an error, the same file
+    picked twice) returns the stored URL instead of sending the file. The
+    file is hashed with SHA-256 in chunks, so memory stays flat, and the
+    result is memoized per (path, size, mtime) so an unchanged file is not
+    even re-read. Entries expire after max_age_days and the least recently
+    used ones are evicted beyond max_entries. The index is a JSON file,
+    replaced atomically on every change.
+
+    Call it from a worker thread (e.g. the upload queue), not the UI thread.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path=None, max_entries=500, max_age_days=30):
+        self.path = path or app_data_path("upload_cache.json")
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._digests = {}
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    @classmethod
+    def hash_file(cls, file_path):
+        """SHA-256 hex digest of a file, read in chunks"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def digest(self, file_path):
+        """Content digest of file_path, reusing a stored one if the file is unchanged"""
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        signature = (path, stat.st_size, stat.st_mtime)
+        with self._lock:
+            if signature in self._digests:
+                return self._digests[signature]
+            for key, entry in self.entries.items():
+                if (entry.get("path"), entry.get("size"), entry.get("mtime")) == signature:
+                    return key
+        key = self.hash_file(file_path)
+        with self._lock:
+            self._digests[signature] = key
+        return key
+
+    def get(self, file_path):
+        """Cached entry (url plus metadata) for the file's content, or None"""
+        key = self.digest(file_path)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["uploaded"] > self.max_age:
+                del self.entries[key]
+                self._save()
+                return None
+            entry["used"] = time.time()
+            self._save()
+            return dict(entry)
+
+    def put(self, file_path, url, **metadata):
+        """Remember that file_path's content is available at url"""
+        key = self.digest(file_path)
+        stat = os.stat(file_path)
+        now = time.time()
+        with self._lock:
+            self.entries[key] = dict(metadata, url=url, path=os.path.abspath(file_path),
+                                     size=stat.st_size, mtime=stat.st_mtime, uploaded=now, used=now)
+            self._evict(now)
+            self._save()
+
+    def _evict(self, now):
+        for key in [k for k, e in self.entries.items() if now - e["uploaded"] > self.max_age]:
+            del self.entries[key]
+        if len(self.entries) > self.max_entries:
+            # Least recently used first
+            by_use = sorted(self.entries, key=lambda k: self.entries[k]["used"])
+            for key in by_use[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+
+    def invalidate(self, file_path=None, url=None):
+        """Forget entries for a file's content and/or a URL (e.g. after the image was deleted)"""
+        key = self.digest(file_path) if file_path and os.path.exists(file_path) else None
+        with self._lock:
+            stale = [k for k, e in self.entries.items() if k == key or (url and e["url"] == url)]
+            for k in stale:
+                del self.entries[k]
+            if stale:
+                self._save()
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+            self._save()
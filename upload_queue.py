@@ -0,0 +1,156 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from app_paths import app_data_path
+
+# Job states
+PENDING = "pending"
+UPLOADING = "uploading"
+DONE = "done"
+FAILED = "failed"
+
+
+class UploadQueue:
+    """Uploads recordings in the background with a small pool of workers.
+
+    Every job is recorded in a JSON journal on disk (rewritten atomically on
+    each state change), so uploads that were pending or in flight when the
+    app closed or crashed are queued again on the next start. Failed uploads
+    are retried with a growing delay, which rides out network outages, until
+    max_attempts is reached.
+
+    Workers never touch the UI: finished jobs are collected with poll() from
+    the UI thread (e.g. from a Tk ``after`` loop).
+    """
+
+    def __init__(self, uploader, journal_path=None, workers=2, retry_delay=15.0, max_attempts=5,
+                 keep_finished=50):
+        self.uploader = uploader
+        self.journal_path = journal_path or app_data_path("upload_queue.json")
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.keep_finished = keep_finished
+
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._todo = queue.Queue()
+        self._finished = queue.Queue()
+        self._closed = False
+
+        self._load_journal()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path, "r") as f:
+                jobs = json.load(f)
+        except (OSError, ValueError):
+            return
+        for job in jobs:
+            if job["status"] in (PENDING, UPLOADING):
+                # Interrupted last time; start over
+                job["status"] = PENDING
+                job["progress"] = 0
+                self._todo.put(job["id"])
+            self.jobs[job["id"]] = job
+        self._save_journal()
+
+    def _save_journal(self):
+        """Write the journal to a temp file and swap it in, so a crash never leaves half a file"""
+        # Snapshot and write under one lock so an older snapshot never lands last
+        with self._journal_lock:
+            with self._lock:
+                finished = [job for job in self.jobs.values() if job["status"] in (DONE, FAILED)]
+                # Only the most recent finished jobs are worth keeping
+                for job in sorted(finished, key=lambda j: j["created"])[:-self.keep_finished or None]:
+                    del self.jobs[job["id"]]
+                data = json.dumps(list(self.jobs.values()), indent=2)
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            temp_path = self.journal_path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.journal_path)
+
+    def submit(self, file_path):
+        """Queue a file for upload; returns the job id"""
+        job = {
+            "id": uuid.uuid4().hex,
+            "file_path": file_path,
+            "status": PENDING,
+            "attempts": 0,
+            "progress": 0,
+            "url": None,
+            "error": None,
+            "created": time.time(),
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+        self._save_journal()
+        self._todo.put(job["id"])
+        return job["id"]
+
+    def _update(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+        self._save_journal()
+
+    def _worker(self):
+        while True:
+            job_id = self._todo.get()
+            if job_id is None:
+                return
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != PENDING:
+                continue
+            self._update(job, status=UPLOADING, attempts=job["attempts"] + 1, progress=0)
+
+            def progress(sent, total, rate):
+                job["progress"] = sent * 100 // total
+
+            result = self.uploader.get_share_url(job["file_path"], progress)
+            if result and not result.startswith("Error"):
+                self._update(job, status=DONE, url=result, error=None, progress=100)
+                self._finished.put(dict(job))
+            elif os.path.exists(job["file_path"]) and job["attempts"] < self.max_attempts:
+                # Probably transient (network, server); try again later
+                self._update(job, status=PENDING, error=result)
+                delay = self.retry_delay * (2 ** (job["attempts"] - 1))
+                timer = threading.Timer(delay, self._retry, (job_id,))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._update(job, status=FAILED, error=result or "Unknown upload error")
+                self._finished.put(dict(job))
+
+    def _retry(self, job_id):
+        if not self._closed:
+            self._todo.put(job_id)
+
+    def poll(self):
+        """Jobs that finished (done or failed) since the last call"""
+        finished = []
+        while True:
+            try:
+                finished.append(self._finished.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def active(self):
+        """Snapshot of the jobs still pending or uploading"""
+        with self._lock:
+            return [dict(job) for job in self.jobs.values() if job["status"] in (PENDING, UPLOADING)]
+
+    def close(self):
+        """Stop the workers after their current upload; unfinished jobs stay in the journal"""
+        self._closed = True
+        for _ in self._threads:
+            self._todo.put(None)
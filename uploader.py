@@ -1,47 +1,139 @@
 import requests
 import os
+import io
+import time
+import uuid
 from dotenv import load_dotenv
-import base64
+from http_client import get_session
+from upload_cache import UploadCache
 
 load_dotenv()
 
+
+class MultipartFileBody:
+    """multipart/form-data request body that streams a file from disk.
+
+    Only the small part headers are held in memory; the file itself is read
+    in chunks as the connection asks for them, so uploading never needs the
+    whole payload (let alone a base64 copy of it) in RAM. Has a length, so
+    requests sends a Content-Length instead of a chunked body.
+
+    progress, if given, is called as progress(bytes_sent, total_bytes,
+    bytes_per_second) after every chunk.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fields, file_field, file_path, file_content_type="application/octet-stream",
+                 progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.file_path = file_path
+        self.progress = progress
+
+        head = []
+        for name, value in fields.items():
+            head.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        filename = os.path.basename(file_path)
+        head.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                    f'filename="{filename}"\r\nContent-Type: {file_content_type}\r\n\r\n')
+        self._head = "".join(head).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.len = len(self._head) + os.path.getsize(file_path) + len(self._tail)
+
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        """Rewind to the start, e.g. to send the body again"""
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.file_path, "rb")
+        self._readers = [io.BytesIO(self._head), self._file, io.BytesIO(self._tail)]
+        self._index = 0
+        self.sent = 0
+        self._started = None
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len
+        chunks = []
+        while size > 0 and self._index < len(self._readers):
+            chunk = self._readers[self._index].read(size)
+            if not chunk:
+                self._index += 1
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        data = b"".join(chunks)
+        self._report(len(data))
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def _report(self, count):
+        if self._started is None:
+            self._started = time.perf_counter()
+        self.sent += count
+        if self.progress and count:
+            elapsed = time.perf_counter() - self._started
+            self.progress(self.sent, self.len, self.sent / elapsed if elapsed > 0 else 0.0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class MediaUploader:
-    def __init__(self):
+    # ImgBB rejects uploads over 32MB
+    MAX_FILE_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, upload_url=None, session=None, cache=None):
         self.imgbb_api_key = os.getenv('IMGBB_API_KEY')
         if not self.imgbb_api_key:
             print("Warning: IMGBB_API_KEY not found in environment variables")
-        self.upload_url = "https://api.imgbb.com/1/upload"
+        # Overridable (argument or IMGBB_UPLOAD_URL) to point at a local stand-in server
+        self.upload_url = upload_url or os.getenv('IMGBB_UPLOAD_URL') or "https://api.imgbb.com/1/upload"
+        # Pooled keep-alive connections with timeouts and retries (see http_client.py)
+        self.session = session or get_session()
+        # Files whose content was uploaded before reuse the earlier URL
+        self.cache = cache or UploadCache()
 
-    def upload_file(self, file_path):
+    def upload_file(self, file_path, progress=None):
         """
         Upload a file to ImgBB
         :param file_path: Path to the file to upload
+        :param progress: Optional callback(bytes_sent, total_bytes, bytes_per_second)
         :return: dict with upload response
         """
         try:
             # Check file size (ImgBB limit is 32MB)
             file_size = os.path.getsize(file_path)
-            if file_size > 32 * 1024 * 1024:  # 32MB in bytes
+            if file_size > self.MAX_FILE_SIZE:
                 return {
                     'success': False,
                     'error': f"File size ({file_size / 1024 / 1024:.1f}MB) exceeds 32MB limit"
                 }
             
-            # Read file as binary and encode as base64
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
-                encoded_data = base64.b64encode(file_data).decode('utf-8')
-                
-                payload = {
-                    'key': self.imgbb_api_key,
-                    'image': encoded_data
-                }
-                
+            # Stream the file as a multipart body rather than base64 in memory
+            body = MultipartFileBody({'key': self.imgbb_api_key}, 'image', file_path,
+                                     'image/gif', progress)
+            try:
                 print(f"Uploading file: {file_path}")  # Debug print
                 print(f"File size: {file_size / 1024 / 1024:.1f}MB")  # Debug print
                 print(f"API Key present: {'Yes' if self.imgbb_api_key else 'No'}")  # Debug print
                 
-                response = requests.post(self.upload_url, data=payload)
+                response = self.session.post(self.upload_url, data=body,
+                                             headers={'Content-Type': body.content_type})
                 
                 # Print response for debugging
                 print(f"Response status: {response.status_code}")  # Debug print
@@ -53,6 +145,8 @@ class MediaUploader:
                     'success': True,
                     'data': response.json()
                 }
+            finally:
+                body.close()
         except requests.exceptions.RequestException as e:
             error_msg = f"Network error: {str(e)}"
             print(error_msg)  # Debug print
@@ -68,10 +162,11 @@ class MediaUploader:
                 'error': error_msg
             }
 
-    def get_share_url(self, file_path):
+    def get_share_url(self, file_path, progress=None):
         """
         Upload file and return shareable URL
         :param file_path: Path to the file to upload
+        :param progress: Optional upload progress callback, see upload_file
         :return: Shareable URL or error message
         """
         if not self.imgbb_api_key:
@@ -85,11 +180,19 @@ class MediaUploader:
         if ext.lower() not in ['.gif']:  # Only allow GIF files
             return f"Error: File type {ext} not supported. Only GIF files are allowed."
             
-        result = self.upload_file(file_path)
+        # Same content uploaded before: reuse its URL instead of sending it again
+        cached = self.cache.get(file_path)
+        if cached:
+            print(f"Using cached upload: {cached['url']}")  # Debug print
+            return cached['url']
+            
+        result = self.upload_file(file_path, progress)
         
         if result['success']:
             try:
-                return result['data']['data']['url']
+                data = result['data']['data']
+                self.cache.put(file_path, data['url'], delete_url=data.get('delete_url'))
+                return data['url']
             except KeyError:
                 error_msg = f"Error: Unexpected API response format: {result['data']}"
                 print(error_msg)  # Debug print